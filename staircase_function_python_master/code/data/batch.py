@@ -0,0 +1,260 @@
+"""
+Batch processing
+
+A Python program to run the processing of the paper (S-function, regularization parameters, non-regularized and regularized
+derivatives, analytical signal amplitude and tilt derivative) on many gridded data sets in a single call.
+
+The grids are read in the binary format of 'grid_io.py'. Grids with the same shape and grid spacing are stacked in 3D-arrays and
+transformed together (see filtering.stack_s_function_norms and filtering.stack_derivative); the stacks are processed by a pool of
+worker processes. The results of each grid are saved in the output folder and the chosen regularization parameters are listed in
+the manifest file 'manifest.json'.
+
+This code is released from the paper: Python programs to apply regularized derivatives in the magnetic tilt derivative and gradient intensity data
+processing: a graphical procedure to choose the regularization parameter.
+
+The program is under the conditions terms in the file README.txt.
+
+authors:Janaína A. Melo (IAG-USP), Carlos A. Mendonça (IAG-USP) and Yara R. Marangoni (IAG-USP) (2023)
+email: janaina.melo@usp.br (J.A. Melo); carlos.mendonca@iag.usp.br (C.A. Mendonça); yaramaran@usp.br. (Y.R. Marangoni)
+"""
+
+import glob
+import json
+import os
+import warnings
+
+import numpy as np
+
+import filtering
+import grid_io
+
+
+
+# Products saved for each grid, as '<name>_<product>.npy'
+_products = ('asa', 'reg_asa', 'tdr', 'reg_tdr')
+
+
+
+def group_grids(filenames, max_stack=16):
+
+    """
+    Groups grid files by shape and grid spacing, in stacks of at most max_stack grids.
+
+    Parameters:
+
+    * filenames: list
+        grid file names (.npy)
+    * max_stack: integer
+        maximum number of grids transformed together (bounds the memory of each task)
+
+    Returns:
+
+    * groups: list
+        lists of grid file names with the same shape and grid spacing
+    """
+
+    groups = {}
+
+    for filename in filenames:
+
+        header = grid_io.read_header(filename)
+        key = (header['shape'], header['spacing'])
+
+        groups.setdefault(key, []).append(filename)
+
+    stacks = []
+
+    for key in sorted(groups):
+        members = groups[key]
+        stacks.extend(members[i:i + max_stack] for i in range(0, len(members), max_stack))
+
+    return stacks
+
+
+
+def process_stack(filenames, output_dir, alpha_test, upper_limit, inferior_limit, value_norm, rfft=True, padding='square',
+                  dtype=np.float64, per_direction=False):
+
+    """
+    Processes a stack of grids with the same shape and grid spacing: S-function, regularization parameters, non-regularized and
+    regularized ASA and TDR. The results of each grid are saved in output_dir as '<name>_asa.npy', '<name>_reg_asa.npy',
+    '<name>_tdr.npy' and '<name>_reg_tdr.npy' (binary grids of 'grid_io.py').
+
+    Parameters:
+
+    * filenames: list
+        grid file names (.npy) with the same shape and grid spacing
+    * output_dir: string
+        output folder
+    * alpha_test: 1D-array
+        trial regularization parameters
+    * upper_limit: float
+        upper limit of the S-function's linear variation interval (None: automatic, see filtering.auto_regularization_parameter)
+    * inferior_limit: float
+        inferior limit of the S-function's linear variation interval (None: automatic)
+    * value_norm: float
+        Euclidean norm-specific value
+    * rfft: boolean
+        if True, uses the real-to-complex transforms
+    * padding: string, integer or tuple
+        padding mode (see filtering.pad_data)
+    * dtype: data type
+        precision of the computation and of the results (np.float64 or np.float32)
+    * per_direction: boolean
+        if True, the regularized derivatives use the regularization parameter of their direction instead of the grid parameter
+
+    Returns:
+
+    * entries: list
+        manifest entries (dictionaries) of the grids
+    """
+
+    grids = [grid_io.load_grid(filename) for filename in filenames]
+    header = grids[0][1]
+    spacing = header['spacing']
+
+    stack = np.stack([np.asarray(values, dtype=dtype) for values, _ in grids])
+
+    # S-function of all the grids of the stack
+    norms = filtering.stack_s_function_norms(stack, spacing, alpha_test, rfft, padding)
+
+    # Regularization parameters of the x-, y- and z-derivatives of all the grids
+    norm_sol = norms / np.max(norms, axis=-1, keepdims=True)
+
+    if upper_limit is None or inferior_limit is None:
+        alpha_vectors, confidence, _ = filtering.auto_regularization_parameter(norm_sol, alpha_test, value_norm)
+    else:
+        alpha_vectors = filtering.regularization_parameter(norm_sol, alpha_test, upper_limit, inferior_limit, value_norm)
+        confidence = None
+
+    # Grid regularization parameters
+    alpha_grid = np.mean(alpha_vectors, axis=1)
+
+    dx, dy, dz = filtering.stack_derivative(stack, spacing, None, rfft, padding)
+    asa, tdr = filtering.asa_tdr(dx, dy, dz)
+
+    reg_alpha = 10 ** alpha_vectors if per_direction else 10 ** alpha_grid
+    reg_dx, reg_dy, reg_dz = filtering.stack_derivative(stack, spacing, reg_alpha, rfft, padding)
+    reg_asa, reg_tdr = filtering.asa_tdr(reg_dx, reg_dy, reg_dz)
+
+    entries = []
+
+    for i, filename in enumerate(filenames):
+
+        name = os.path.splitext(os.path.basename(filename))[0]
+        outputs = {}
+
+        for product, values in zip(_products, (asa, reg_asa, tdr, reg_tdr)):
+            outputs[product] = os.path.join(output_dir, '%s_%s.npy' % (name, product))
+            grid_io.save_grid(outputs[product], values[i], spacing, grids[i][1]['origin'])
+
+        missing = [direction for direction, alpha in zip('xyz', alpha_vectors[i]) if not np.isfinite(alpha)]
+
+        if missing:
+            warnings.warn("%s: no regularization parameter found in direction(s) %s (S-function without a linear variation "
+                          "interval), the regularized results are NaN" % (filename, ', '.join(missing)))
+
+        entries.append({'input': filename, 'shape': list(header['shape']), 'spacing': list(spacing),
+                        'alpha_x': _finite(alpha_vectors[i, 0]), 'alpha_y': _finite(alpha_vectors[i, 1]),
+                        'alpha_z': _finite(alpha_vectors[i, 2]), 'alpha_grid': _finite(alpha_grid[i]), 'outputs': outputs})
+
+        if confidence is not None:
+            entries[-1].update(confidence_x=_finite(confidence[i, 0]), confidence_y=_finite(confidence[i, 1]),
+                               confidence_z=_finite(confidence[i, 2]))
+
+    return entries
+
+
+
+def _finite(value):
+
+    """
+    Converts a value of the manifest to a float, or None if it is not finite (NaN is not valid JSON).
+    """
+
+    return float(value) if np.isfinite(value) else None
+
+
+
+def _process_stack(args):
+
+    """
+    Calls process_stack with a tuple of arguments (worker pool task).
+    """
+
+    return process_stack(*args)
+
+
+
+def run_batch(inputs, output_dir, alpha_test, upper_limit, inferior_limit, value_norm, n_jobs=1, max_stack=16, rfft=True,
+              padding='square', dtype=np.float64, per_direction=False):
+
+    """
+    Runs the processing of the paper on many grids and writes the manifest file 'manifest.json' in the output folder, with the
+    regularization parameters (exponents, as printed by the scripts) and the result files of each grid. With the automatic choice of
+    the regularization parameters (no limits), the entries also hold the confidence of each parameter.
+
+    Parameters:
+
+    * inputs: list or string
+        grid file names (.npy), or a folder whose '.npy' grids are processed (except the results of a previous run, named 
+        '<name>_asa.npy', '<name>_reg_asa.npy', '<name>_tdr.npy' and '<name>_reg_tdr.npy')
+    * output_dir: string
+        output folder
+    * alpha_test: 1D-array
+        trial regularization parameters
+    * upper_limit: float
+        upper limit of the S-function's linear variation interval (None: automatic, see filtering.auto_regularization_parameter)
+    * inferior_limit: float
+        inferior limit of the S-function's linear variation interval (None: automatic)
+    * value_norm: float
+        Euclidean norm-specific value
+    * n_jobs: integer
+        number of worker processes (-1 uses all the processors)
+    * max_stack: integer
+        maximum number of grids transformed together
+    * rfft: boolean
+        if True, uses the real-to-complex transforms
+    * padding: string, integer or tuple
+        padding mode (see filtering.pad_data)
+    * dtype: data type
+        precision of the computation and of the results (np.float64 or np.float32)
+    * per_direction: boolean
+        if True, the regularized derivatives use the regularization parameter of their direction instead of the grid parameter
+
+    Returns:
+
+    * manifest: list
+        manifest entries (dictionaries) of the grids, in the order of the inputs; the parameters that were not found are None
+    """
+
+    if isinstance(inputs, str):
+
+        # The results are not processed again when the output folder is the input folder
+        suffixes = tuple('_%s.npy' % product for product in _products)
+        inputs = [filename for filename in sorted(glob.glob(os.path.join(inputs, '*.npy'))) if not filename.endswith(suffixes)]
+
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    tasks = [(stack, output_dir, alpha_test, upper_limit, inferior_limit, value_norm, rfft, padding, dtype, per_direction)
+             for stack in group_grids(inputs, max_stack)]
+
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count() or 1
+
+    if n_jobs == 1 or len(tasks) < 2:
+        results = [_process_stack(task) for task in tasks]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(min(n_jobs, len(tasks))) as executor:
+            results = list(executor.map(_process_stack, tasks))
+
+    entries = dict((entry['input'], entry) for result in results for entry in result)
+    manifest = [entries[filename] for filename in inputs]
+
+    with open(os.path.join(output_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, allow_nan=False)
+
+    return manifest
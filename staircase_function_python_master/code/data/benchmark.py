@@ -0,0 +1,295 @@
+"""
+Benchmarks
+
+A Python program to time the functions of "filtering.py" and measure their peak memory on grids of increasing size, for several
+numbers of trial regularization parameters, FFT backends, padding modes and precisions:
+
+    python benchmark.py
+    python benchmark.py --sizes 256 1024 4096 8192 2048x512 --alphas 41 401 --backends numpy scipy --paddings square fast
+    python benchmark.py --output results/benchmark.json
+    python benchmark.py --compare results/benchmark.json
+
+The grids are the synthetic data set ('input/synthetic_data.dat') interpolated to each size (NxM for non-square grids). Each case
+is run 'repeat' times with an empty cache of prepared grids and the shortest time is reported; the peak memory is measured by
+tracemalloc in a separate run. With --compare, the times are compared with a previous output file and the cases slower than the
+tolerance are reported, so that performance regressions can be caught.
+
+This code is released from the paper: Python programs to apply regularized derivatives in the magnetic tilt derivative and gradient intensity data
+processing: a graphical procedure to choose the regularization parameter.
+
+The program is under the conditions terms in the file README.txt.
+
+authors:Janaína A. Melo (IAG-USP), Carlos A. Mendonça (IAG-USP) and Yara R. Marangoni (IAG-USP) (2023)
+email: janaina.melo@usp.br (J.A. Melo); carlos.mendonca@iag.usp.br (C.A. Mendonça); yaramaran@usp.br. (Y.R. Marangoni)
+"""
+
+import argparse
+import itertools
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import filtering
+import grid_io
+
+
+
+def upscaled_grid(shape, xyz_file='input/synthetic_data.dat'):
+
+    """
+    Interpolates (bilinearly) the grid of an XYZ file to a new shape over the same area.
+
+    Parameters:
+
+    * shape: tuple = (nx, ny)
+        data points number in each direction
+    * xyz_file: string
+        XYZ text file name of the original grid
+
+    Returns:
+
+    * x, y: 1D-array
+        coordinates mesh in x- and y-directions
+    * data: 1D-array
+        interpolated data set
+    """
+
+    values, header = grid_io.read_xyz(xyz_file)
+
+    (nx0, ny0), (dx0, dy0) = header['shape'], header['spacing']
+    nx, ny = shape
+
+    # Positions of the new points in the index space of the original grid
+    u = np.linspace(0, nx0 - 1, nx)
+    v = np.linspace(0, ny0 - 1, ny)
+
+    rows = np.array([np.interp(v, np.arange(ny0), row) for row in values])
+    data = np.array([np.interp(u, np.arange(nx0), column) for column in rows.T]).T
+
+    spacing = (dx0 * (nx0 - 1) / max(nx - 1, 1), dy0 * (ny0 - 1) / max(ny - 1, 1))
+    x, y = grid_io.grid_coordinates({'shape': (nx, ny), 'spacing': spacing, 'origin': header['origin']})
+
+    return x, y, np.ravel(data)
+
+
+
+def measure(function, repeat=3):
+
+    """
+    Runs a function 'repeat' times with an empty cache of prepared grids and returns the shortest time (s) and the peak memory
+    (bytes) traced during an additional run.
+    """
+
+    times = []
+
+    for i in range(repeat):
+        filtering.clear_grid_cache()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    filtering.clear_grid_cache()
+    tracemalloc.start()
+
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    filtering.clear_grid_cache()
+
+    return min(times), peak
+
+
+
+def cases(x, y, data, shape, nalpha, padding, rfft, dtype):
+
+    """
+    Yields the benchmark cases (name, number of trial regularization parameters, function) of a grid.
+    """
+
+    padshape = filtering.pad_data(data, shape, padding)[0].shape
+
+    yield 'pad_data', None, lambda: filtering.pad_data(data, shape, padding, dtype)
+    yield 'fft_wavenumbers', None, lambda: filtering.fft_wavenumbers(x, y, shape, padshape, rfft)
+    yield 'nonregularized_derivative', None, lambda: filtering.nonregularized_derivative(x, y, data, shape, 1, rfft, padding, dtype)
+    yield 'regularized_derivative', None, lambda: filtering.regularized_derivative(x, y, data, shape, 1e5, rfft, padding, dtype)
+
+    for n in nalpha:
+
+        alpha_test = 10 ** np.linspace(-6, 14, n)
+
+        yield 's_function', n, lambda: filtering.s_function(x, y, data, shape, alpha_test, rfft=rfft, padding=padding, dtype=dtype)
+
+        norms = np.array(filtering.s_function(x, y, data, shape, alpha_test, rfft=rfft, padding=padding, dtype=dtype))
+
+        yield 'regularization_parameter', n, lambda: filtering.regularization_parameter(norms, alpha_test, 0.7, 0.45, 0.5)
+
+    derivs = filtering.regularized_derivative(x, y, data, shape, 1e5, rfft, padding, dtype)
+
+    yield 'asa_tdr', None, lambda: filtering.asa_tdr(*derivs)
+
+
+
+def run(sizes, nalpha, backends=('numpy',), paddings=('square',), rfft=(False,), dtypes=('float64',), repeat=3,
+        xyz_file='input/synthetic_data.dat', log=None):
+
+    """
+    Runs the benchmarks on all the combinations of grid sizes, FFT backends, padding modes, transforms and precisions.
+
+    Parameters:
+
+    * sizes: list
+        grid shapes, tuples = (nx, ny)
+    * nalpha: list
+        numbers of trial regularization parameters of s_function
+    * backends: list
+        FFT backends (see filtering.set_fft_backend)
+    * paddings: list
+        padding modes (see filtering.pad_data)
+    * rfft: list
+        kinds of transform (False: full spectrum, True: real-to-complex)
+    * dtypes: list
+        precisions ('float64', 'float32')
+    * repeat: integer
+        number of timed runs of each case
+    * xyz_file: string
+        XYZ text file name of the grid that is interpolated to each size
+    * log: file
+        stream where each result is printed as it is obtained (None: silent)
+
+    Returns:
+
+    * results: list
+        one dictionary per case: function, shape, nalpha, backend, padding, rfft, dtype, time (s) and peak memory (MB)
+    """
+
+    results = []
+
+    for shape in sizes:
+
+        x, y, data = upscaled_grid(shape, xyz_file)
+
+        for backend, padding, half, dtype in itertools.product(backends, paddings, rfft, dtypes):
+
+            active = filtering.set_fft_backend(backend)
+
+            for name, n, function in cases(x, y, data, shape, nalpha, padding, half, np.dtype(dtype).type):
+
+                elapsed, peak = measure(function, repeat)
+
+                result = {'function': name, 'shape': list(shape), 'nalpha': n, 'backend': active, 'padding': padding,
+                          'rfft': half, 'dtype': dtype, 'time': elapsed, 'peak_mb': peak / 2.0 ** 20}
+                results.append(result)
+
+                if log is not None:
+                    log.write('%-26s %11s %6s %7s %7s %6s %8s %10.4f s %10.1f MB\n' % (
+                        name, '%dx%d' % tuple(shape), '' if n is None else n, active, padding, 'rfft' if half else 'fft', dtype,
+                        elapsed, result['peak_mb']))
+                    log.flush()
+
+    filtering.set_fft_backend('numpy')
+
+    return results
+
+
+
+def _key(result):
+
+    """
+    Identifies a benchmark case in the comparison of two result files.
+    """
+
+    return (result['function'], tuple(result['shape']), result['nalpha'], result['backend'], str(result['padding']),
+            result['rfft'], result['dtype'])
+
+
+
+def compare(results, previous, tolerance=1.2):
+
+    """
+    Compares the times of two benchmark runs.
+
+    Parameters:
+
+    * results: list
+        current results (see run)
+    * previous: list
+        results of a previous run
+    * tolerance: float
+        ratio of the times above which a case is reported as slower
+
+    Returns:
+
+    * regressions: list
+        (case, previous time, current time) of the cases slower than the tolerance
+    """
+
+    reference = dict((_key(result), result['time']) for result in previous)
+
+    return [(_key(result), reference[_key(result)], result['time']) for result in results
+            if _key(result) in reference and result['time'] > tolerance * reference[_key(result)]]
+
+
+
+def _shape(value):
+
+    """
+    Parses a grid size: 'N' for a square grid or 'NxM'.
+    """
+
+    sizes = [int(n) for n in value.lower().split('x')]
+
+    return (sizes[0], sizes[-1])
+
+
+
+def main(argv=None):
+
+    """
+    Runs the benchmarks from the command line.
+    """
+
+    parser = argparse.ArgumentParser(description='Benchmarks of the functions of filtering.py.')
+    parser.add_argument('--sizes', type=_shape, nargs='+', default=[(256, 256), (512, 512), (1024, 1024), (2048, 2048), (2048, 512)],
+                        help="grid sizes, 'N' or 'NxM' (e.g. 256 1024 8192 2048x512)")
+    parser.add_argument('--alphas', type=int, nargs='+', default=[41], help='numbers of trial regularization parameters')
+    parser.add_argument('--backends', nargs='+', default=['numpy'], choices=('numpy', 'scipy', 'pyfftw'), help='FFT backends')
+    parser.add_argument('--paddings', nargs='+', default=['square'], help='padding modes (square, power2, fast)')
+    parser.add_argument('--rfft', action='store_true', help='also runs the real-to-complex transforms')
+    parser.add_argument('--dtypes', nargs='+', default=['float64'], choices=('float64', 'float32'), help='precisions')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs of each case')
+    parser.add_argument('--input', default='input/synthetic_data.dat', help='XYZ file of the grid interpolated to each size')
+    parser.add_argument('--output', help='JSON output file')
+    parser.add_argument('--compare', help='JSON output file of a previous run')
+    parser.add_argument('--tolerance', type=float, default=1.2, help='time ratio reported as a regression')
+
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.alphas, args.backends, args.paddings, (False, True) if args.rfft else (False,), args.dtypes,
+                  args.repeat, args.input, log=sys.stdout)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+        for case, before, after in regressions:
+            sys.stdout.write('slower: %s %.4f s -> %.4f s\n' % (case, before, after))
+
+        return 1 if regressions else 0
+
+    return 0
+
+
+
+if __name__ == '__main__':
+    sys.exit(main())
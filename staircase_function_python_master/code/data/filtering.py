@@ -1,354 +1,2716 @@
-"""
-A Python program evaluates the non-regularized and regularized directional derivatives and S-function, estimates regularization parameters, 
-and computes analytical signal amplitude and tilt derivative on gridded data.
-
-This code is released from the paper: Python programs to apply regularized derivatives in the magnetic tilt derivative and gradient intensity data 
-processing: a graphical procedure to choose the regularization parameter.
-
-The program is under the conditions terms in the file README.txt.
-
-authors:Janaína A. Melo (IAG-USP), Carlos A. Mendonça (IAG-USP) and Yara R. Marangoni (IAG-USP) (2023)
-email: janaina.melo@usp.br (J.A. Melo); carlos.mendonca@iag.usp.br (C.A. Mendonça); yaramaran@usp.br. (Y.R. Marangoni)
-"""
-
-import numpy as np
-from sklearn.linear_model import LinearRegression
-
-
-
-def pad_data(data, shape):
-
-    """
-    Padded data until reaches the length of the next higher power of two, and the pad values are the edge values. 
-
-    Based on Fatiando a Terra package (https://www.fatiando.org/).
-    
-    Parameters:
-        
-    * data: 1D-array
-        input data set 
-    * shape: tuple = (nx, ny)
-        data points number in each direction 
-        
-    Returns:
-        
-    * padded_data: 2D-array
-        data set padded
-    * padx: float
-        x-direction padded
-    * pady: float
-        y-direction padded
-    """
-
-    nx, ny = shape
-    n_points=int(2**(np.ceil(np.log(np.max(shape))/np.log(2))))
-
-    padx = (n_points - nx) // 2
-    pady = (n_points - ny) // 2
-
-    # Pads the matrix edges
-    padded_data = np.pad(data.reshape(shape), ((padx, padx), (pady, pady)), mode='edge')
-
-    return padded_data, padx, pady
-
-
-
-def fft_wavenumbers(x, y, shape, padshape):
-
-    """
-    Computes the wavenumbers 2D-arrays.
-
-    Based on Fatiando a Terra package (https://www.fatiando.org/).
-    
-    Parameters:
-
-    * x, y: 2D-array
-        coordinates mesh in x- and y-directions
-    * shape: tuple = (nx, ny)
-        data points number in each direction before padding
-    * padshape: tuple = (nx, ny)
-        data points number in each direction after padding             
-    
-    Returns:
-
-    * kx, ky: 2D-array
-        wavenumbers in x- and y-directions
-    """
-
-    nx, ny = shape
-
-    # Discretization range
-    dx = (x.max() - x.min()) / (nx - 1)
-    dy = (y.max() - y.min()) / (ny - 1)
-
-    # Wavenumbers in the x- and y-directions
-    kx = 2 * np.pi * np.fft.fftfreq(padshape[0], dx)
-    ky = 2 * np.pi * np.fft.fftfreq(padshape[1], dy)
-
-    return np.meshgrid(ky, kx)[::-1]
-
-
-
-def nonregularized_derivative(x, y, data, shape, order):
-
-    """
-    Computes the non-regularized derivatives in the Fourier domain in the x-, y-, and z-directions using equation 3 of the paper.
-
-    Based on Fatiando a Terra package (https://www.fatiando.org/).
-
-    Parameters:
-
-    * x, y: 1D-array
-        coordinates mesh in x- and y-directions
-    * data: 1D-array
-        input data set
-    * shape: tuple = (nx, ny)
-        data points number in each direction 
-    * order: integer
-        derivative order
-
-    Returns:
-
-    * dx, dy, dz: 1D-array
-        derivatives in x-, y- and z-directions
-    """
-
-    nx, ny = shape
-
-    # Fills the matriz edges 
-    padded, padx, pady = pad_data(data, shape)
-
-    # Wavenumbers in x- and y-directions
-    kx, ky = fft_wavenumbers(x, y, shape, padded.shape)  
-
-    # Calculates the derivatives in the Fourier domain
-    derivx_fft = np.fft.fft2(padded) * ((kx * 1j) ** order)
-    derivy_fft = np.fft.fft2(padded) * ((ky * 1j) ** order)
-    derivz_fft = np.fft.fft2(padded) * (np.sqrt(kx ** 2 + ky ** 2) ** order)
-
-    # np.real: returns the real part of the complex argument
-    # np.fft.ifft2: calculates the two-dimensional inverse discrete Fourier transform
-    derivx_pad = np.real(np.fft.ifft2(derivx_fft))
-    derivy_pad = np.real(np.fft.ifft2(derivy_fft))
-    derivz_pad = np.real(np.fft.ifft2(derivz_fft))
-
-    # Removes the padding in derivative
-    derivx = derivx_pad[padx: padx + nx, pady: pady + ny]
-    derivy = derivy_pad[padx: padx + nx, pady: pady + ny]
-    derivz = derivz_pad[padx: padx + nx, pady: pady + ny]
-
-    # Converts a matrix to a 1D vector
-    dx = np.ravel(derivx)
-    dy = np.ravel(derivy)
-    dz = np.ravel(derivz)
-
-    return dx, dy, dz
-
-
-
-def regularized_derivative(x, y, data, shape, alpha):
-
-    """
-    Computes the regularized first-order derivatives in the Fourier domain in the x-, y-, and z-directions using equation 5 of the paper.
-
-    Parameters:
-
-    * x, y: 1D-array
-        coordinates mesh in x- and y-directions
-    * data: 1D-array
-        input data set
-    * shape: tuple = (nx, ny)
-        data points number in each direction 
-    * alpha: float
-        regularization parameter
-
-    Returns:
-
-    * dx, dy, dz: 1D-array
-        derivatives in x-, y- and z-directions
-    """
-    
-    nx, ny = shape
-
-    # Fills the matriz edges 
-    padded, padx, pady = pad_data(data, shape)
-    
-    # Wavenumbers in x-, y- and z-directions
-    kx, ky = fft_wavenumbers(x, y, shape, padded.shape)  
-    kz = np.sqrt(kx ** 2 + ky ** 2)
-
-    # Spectral characteristic low pass filter
-    gamma_y = ((1j) * ky) / (1 + alpha * (ky ** 2))
-    gamma_x = ((1j) * kx) / (1 + alpha * (kx ** 2))
-    gamma_z = kz / (1 + alpha * (kz ** 2))
-
-    # Calculates the derivatives in the Fourier domain
-    derivx_fft = np.fft.fft2(padded) * (gamma_x)
-    derivy_fft = np.fft.fft2(padded) * (gamma_y)
-    derivz_fft = np.fft.fft2(padded) * (gamma_z)
-
-    # np.real: returns the real part of the complex argument
-    # np.fft.ifft2: calculates the two-dimensional inverse discrete Fourier transform
-    derivx_pad = np.real(np.fft.ifft2(derivx_fft))
-    derivy_pad = np.real(np.fft.ifft2(derivy_fft))
-    derivz_pad = np.real(np.fft.ifft2(derivz_fft))
-
-    # Removes the padding in derivative
-    derivx = derivx_pad[padx: padx + nx, pady: pady + ny]
-    derivy = derivy_pad[padx: padx + nx, pady: pady + ny]
-    derivz = derivz_pad[padx: padx + nx, pady: pady + ny]
-
-    # Converts a matrix to a 1D vector
-    dy = np.ravel(derivy)
-    dx = np.ravel(derivx)
-    dz = np.ravel(derivz)
-
-    return dx, dy, dz
-
-
-
-def s_function(x, y, data, shape, alpha):
-
-    """
-    Computes the normalized Euclidean norm of the directional derivatives to different regularization parameter values using equations 
-    6 and 7 of the paper.
-
-    Parameters:
-
-    * x, y: 1D-array
-        coordinates mesh in x- and y-directions
-    * data: 1D-array
-        input data set
-    * shape: tuple = (nx, ny)
-        data points number in each direction 
-    * alpha: 1D-array
-        trial regularization parameters
-
-    Returns:
-
-    * norm_sol_dx, norm_sol_dy, norm_sol_dz: 1D-array
-        normalized Euclidean norm of the x-, y- and z-derivatives to different regularization parameter values
-    """
-
-    norm_sol_dx = []
-    norm_sol_dy = []
-    norm_sol_dz = []
-
-    for i in range(len(alpha)):
-
-        dx, dy, dz = regularized_derivative(x, y, data, shape, alpha[i])
-
-        soma_x = 0
-        soma_y = 0
-        soma_z = 0
-
-        for i in range(len(dx)):
-
-            elem_dx = dx[i] ** 2
-            elem_dy = dy[i] ** 2
-            elem_dz = dz[i] ** 2
-
-            soma_x = soma_x + elem_dx
-            soma_y = soma_y + elem_dy
-            soma_z = soma_z + elem_dz
-
-        norm_dx = np.sqrt(soma_x)
-        norm_dy = np.sqrt(soma_y)
-        norm_dz = np.sqrt(soma_z)
-
-        norm_sol_dx.append(norm_dx)
-        norm_sol_dy.append(norm_dy)
-        norm_sol_dz.append(norm_dz)
-
-    norm_sol_dx = np.ravel(norm_sol_dx)
-    norm_sol_dy = np.ravel(norm_sol_dy)
-    norm_sol_dz = np.ravel(norm_sol_dz)
-
-    norm_sol_dx = norm_sol_dx/max(norm_sol_dx)
-    norm_sol_dy = norm_sol_dy/max(norm_sol_dy)
-    norm_sol_dz = norm_sol_dz/max(norm_sol_dz)
-
-    return norm_sol_dx, norm_sol_dy, norm_sol_dz
-
-
-
-def regularization_parameter(norm_sol, alpha_test, upper_limit, inferior_limit, value_norm):
-
-    """
-    Determines the regularization parameter associated with a Euclidean norm-specific value located in the S-function sloped portion. 
-    As the S-function is evaluated for regularization parameter discrete values, it is fitted a linear approximation in the S-function 
-    sloped portion considering a specific interval [inferior limit, upper limit].
-
-    Parameters:
-
-    * norm_sol: 1D-array
-        Euclidean norm of the regularized derivatives
-    * alpha_test: 1D-array
-        Trial regularization parameters
-    * upper_limit: float
-        Upper limit of the S-function's linear variation interval 
-    * inferior_limit: float
-        Inferior limit of the S-function's linear variation interval 
-    * value_norm: float
-        Euclidean norm-specific value
-    Returns:
-
-    * alpha_value: float
-        regularization parameter associate with Euclidean norm-specific value
-    """
-
-    norm = []
-    alpha = []
-
-    # Defines the linear variation vector of the S-function and the vector of associated regularization parameters
-    for i in range (len(norm_sol)):
-
-        if  (inferior_limit <= np.round(norm_sol[i],1) <= upper_limit):
-            norm.append(norm_sol[i])
-            alpha.append(alpha_test[i])
-
-    alpha = np.array(alpha).reshape(-1,1)
-
-    # Fits a linear regression model
-    linreg = LinearRegression().fit(alpha, norm)
-
-    # calculates the angular and linear coefficients for the linear regression
-    a = linreg.coef_
-    b = linreg.intercept_
-
-    # Calculates the regularization parameter associated with a particular Euclidean norm value
-    alpha_value = np.log10((value_norm - b)/a)
-
-    return alpha_value
-
-
-
-def asa_tdr(dx, dy, dz):
-
-    """
-    Computes the analytical signal amplitude and tilt derivative using equations 1 and 2 of the paper, respectively.
-
-    Parameters:
-
-    * dx: 1D-array
-        x-derivative
-    * dy: 1D-array
-        y-derivative
-    * dz: 1D-array
-        z-derivative
-
-    Returns:
-
-    * asa: 1D-array
-        analytical signal amplitude
-    * tdr: 1D-array
-        tilt derivative
-    """
-
-    horiz_deriv = np.sqrt(dx ** 2 + dy ** 2)
-
-    tdr = np.arctan2(dz, horiz_deriv)
-
-    asa = np.sqrt(dx ** 2 + dy ** 2 + dz ** 2)
-
-    return asa, tdr
+"""
+A Python program evaluates the non-regularized and regularized directional derivatives and S-function, estimates regularization parameters, 
+and computes analytical signal amplitude and tilt derivative on gridded data.
+
+This code is released from the paper: Python programs to apply regularized derivatives in the magnetic tilt derivative and gradient intensity data 
+processing: a graphical procedure to choose the regularization parameter.
+
+The program is under the conditions terms in the file README.txt.
+
+authors:Janaína A. Melo (IAG-USP), Carlos A. Mendonça (IAG-USP) and Yara R. Marangoni (IAG-USP) (2023)
+email: janaina.melo@usp.br (J.A. Melo); carlos.mendonca@iag.usp.br (C.A. Mendonça); yaramaran@usp.br. (Y.R. Marangoni)
+"""
+
+import atexit
+import collections
+import hashlib
+import multiprocessing
+import os
+import pickle
+import tempfile
+import warnings
+
+import numpy as np
+
+import profiling
+
+
+
+# Active FFT backend (see set_fft_backend)
+_fft_backend = {'name': 'numpy', 'module': np.fft, 'kwargs': {}, 'wisdom_file': None}
+
+# Prepared grids of the session, least recently used first (see prepare_grid)
+_grid_cache = collections.OrderedDict()
+_grid_cache_size = {'max_bytes': 512 * 2 ** 20}
+
+# On-disk cache of the S-function norms (see set_norm_cache), disabled by default
+_norm_cache = {'directory': None, 'max_bytes': 64 * 2 ** 20}
+
+
+
+def next_fast_len(n):
+
+    """
+    Returns the smallest 5-smooth number (2**a * 3**b * 5**c) greater than or equal to n. The discrete Fourier transforms are fast 
+    for these lengths.
+
+    Parameters:
+
+    * n: integer
+        minimum length
+
+    Returns:
+
+    * length: integer
+        fast transform length
+    """
+
+    length = None
+    power5 = 1
+
+    while power5 < 2 * n:
+
+        power35 = power5
+
+        while power35 < 2 * n:
+
+            # Smallest power of two times power35 not lower than n
+            candidate = power35
+            while candidate < n:
+                candidate *= 2
+
+            if length is None or candidate < length:
+                length = candidate
+
+            power35 *= 3
+
+        power5 *= 5
+
+    return length
+
+
+
+@profiling.profiled('pad_data')
+def pad_data(data, shape, padding='square', dtype=None, min_pad=0.1):
+
+    """
+    Padded data until reaches the length of the next higher power of two, and the pad values are the edge values. 
+
+    Based on Fatiando a Terra package (https://www.fatiando.org/).
+
+    The padding mode defines the padded shape:
+
+    - 'square': both directions padded to the next power of two of the largest dimension (paper results)
+    - 'power2': each direction padded to the next power of two of its length plus the minimum margins
+    - 'fast': each direction padded to the next 5-smooth length (see next_fast_len) of its length plus the minimum margins
+    - integer or tuple = (widthx, widthy): number of points padded on each side of the grid in each direction
+
+    Except in the 'square' mode, an odd number of padded points puts the extra point at the end of the direction. In the 'power2' 
+    and 'fast' modes, each side is padded with at least min_pad times the length of the direction, so that a grid whose length is 
+    already a power of two or 5-smooth (e.g. 100, 500 or 1000 points) keeps a margin and the transform does not wrap its opposite 
+    edges around.
+    
+    Parameters:
+        
+    * data: 1D-array
+        input data set (or 3D-array = (n, nx, ny) of n data sets padded together)
+    * shape: tuple = (nx, ny)
+        data points number in each direction 
+    * padding: string, integer or tuple
+        padding mode
+    * dtype: data type
+        type of the padded data (e.g. np.float32 for the single precision mode); None keeps the type of the data
+    * min_pad: float
+        minimum padding on each side in the 'power2' and 'fast' modes, as a fraction of the length of the direction
+        
+    Returns:
+        
+    * padded_data: 2D-array
+        data set padded (3D-array for n data sets)
+    * padx: float
+        x-direction padded
+    * pady: float
+        y-direction padded
+    """
+
+    pad_width = _pad_widths(shape, padding, min_pad)
+    padx, pady = pad_width[0][0], pad_width[1][0]
+
+    # Stacks of data sets are padded on the last two axes
+    if np.ndim(data) > 2:
+        data = np.reshape(data, np.shape(data)[:-2] + tuple(shape))
+        pad_width = ((0, 0),) * (np.ndim(data) - 2) + pad_width
+    else:
+        data = np.reshape(data, shape)
+
+    if dtype is not None:
+        data = np.asarray(data, dtype=dtype)
+
+    # Pads the matrix edges
+    padded_data = np.pad(data, pad_width, mode='edge')
+
+    return padded_data, padx, pady
+
+
+
+def _pad_widths(shape, padding='square', min_pad=0.1):
+
+    """
+    Numbers of points ((before x, after x), (before y, after y)) padded on each side of a grid by pad_data.
+    """
+
+    nx, ny = shape
+
+    if padding == 'square':
+
+        n_points=int(2**(np.ceil(np.log(np.max(shape))/np.log(2))))
+
+        padx = (n_points - nx) // 2
+        pady = (n_points - ny) // 2
+
+        pad_width = ((padx, padx), (pady, pady))
+
+    else:
+
+        # Lengths with the minimum margins on both sides
+        minimum = [n + 2 * int(np.ceil(min_pad * n)) for n in shape]
+
+        if padding == 'power2':
+            padshape = [int(2**(np.ceil(np.log(n)/np.log(2)))) for n in minimum]
+        elif padding == 'fast':
+            padshape = [next_fast_len(n) for n in minimum]
+        elif np.ndim(padding) == 0 and not isinstance(padding, str):
+            padshape = [n + 2 * int(padding) for n in shape]
+        elif np.ndim(padding) == 1 and len(padding) == 2:
+            padshape = [n + 2 * int(w) for n, w in zip(shape, padding)]
+        else:
+            raise ValueError("padding must be 'square', 'power2', 'fast', an integer or a pair of integers, not %r" % (padding,))
+
+        padx = (padshape[0] - nx) // 2
+        pady = (padshape[1] - ny) // 2
+
+        pad_width = ((padx, padshape[0] - nx - padx), (pady, padshape[1] - ny - pady))
+
+    return pad_width
+
+
+
+def fft_wavenumbers(x, y, shape, padshape, half=False):
+
+    """
+    Computes the wavenumbers 2D-arrays.
+
+    Based on Fatiando a Terra package (https://www.fatiando.org/).
+    
+    Parameters:
+
+    * x, y: 2D-array
+        coordinates mesh in x- and y-directions
+    * shape: tuple = (nx, ny)
+        data points number in each direction before padding
+    * padshape: tuple = (nx, ny)
+        data points number in each direction after padding             
+    * half: boolean
+        if True, only the non-negative y-wavenumbers of the real-to-complex transform (np.fft.rfft2) are returned
+    
+    Returns:
+
+    * kx, ky: 2D-array
+        wavenumbers in x- and y-directions
+    """
+
+    return _wavenumbers(_grid_spacing(x, y, shape), padshape, half)
+
+
+
+def _grid_spacing(x, y, shape):
+
+    """
+    Grid spacing (dx, dy) of the coordinates mesh.
+    """
+
+    nx, ny = shape
+
+    # Discretization range
+    dx = (np.max(x) - np.min(x)) / (nx - 1)
+    dy = (np.max(y) - np.min(y)) / (ny - 1)
+
+    return dx, dy
+
+
+
+def _wavenumbers(spacing, padshape, half=False):
+
+    """
+    Wavenumbers 2D-arrays of a padded grid with spacing = (dx, dy) (see fft_wavenumbers).
+    """
+
+    dx, dy = spacing
+
+    # Wavenumbers in the x- and y-directions
+    kx = 2 * np.pi * np.fft.fftfreq(padshape[0], dx)
+    if half:
+        ky = 2 * np.pi * np.fft.rfftfreq(padshape[1], dy)
+    else:
+        ky = 2 * np.pi * np.fft.fftfreq(padshape[1], dy)
+
+    return np.meshgrid(ky, kx)[::-1]
+
+
+
+def set_fft_backend(name='numpy', workers=None, wisdom_file=None):
+
+    """
+    Selects the library that computes the discrete Fourier transforms of all the functions of this module.
+
+    If the requested library is not installed, a warning is issued and the NumPy backend is used.
+
+    Parameters:
+
+    * name: string
+        'numpy' (np.fft, single-threaded), 'scipy' (scipy.fft) or 'pyfftw' (pyFFTW, with cached FFTW plans)
+    * workers: integer
+        number of threads of the 'scipy' and 'pyfftw' backends (-1 uses all the processors)
+    * wisdom_file: string
+        file in which the FFTW plans ("wisdom") of the 'pyfftw' backend are loaded from and saved to at exit, so that later runs on 
+        grids with the same padded shape reuse them
+
+    Returns:
+
+    * name: string
+        name of the active backend
+    """
+
+    if name not in ('numpy', 'scipy', 'pyfftw'):
+        raise ValueError("name must be 'numpy', 'scipy' or 'pyfftw', not %r" % (name,))
+
+    if workers == -1 and name == 'pyfftw':
+        workers = multiprocessing.cpu_count()
+
+    module = np.fft
+    kwargs = {}
+
+    if name == 'scipy':
+
+        try:
+            import scipy.fft as module
+        except ImportError:
+            warnings.warn("scipy.fft is not available, using the numpy FFT backend")
+            name, module = 'numpy', np.fft
+        else:
+            if workers is not None:
+                kwargs = {'workers': workers}
+
+    elif name == 'pyfftw':
+
+        try:
+            import pyfftw
+            import pyfftw.interfaces.numpy_fft as module
+        except ImportError:
+            warnings.warn("pyFFTW is not available, using the numpy FFT backend")
+            name, module = 'numpy', np.fft
+        else:
+            # Keeps the FFTW objects of the last transforms alive, so that repeated shapes skip the planning
+            pyfftw.interfaces.cache.enable()
+            kwargs = {'threads': workers or 1, 'planner_effort': 'FFTW_MEASURE'}
+
+            if wisdom_file is not None:
+                load_fft_wisdom(wisdom_file)
+
+    if name != 'pyfftw':
+        wisdom_file = None
+
+    _fft_backend.update(name=name, module=module, kwargs=kwargs, wisdom_file=wisdom_file)
+
+    return name
+
+
+
+def get_fft_backend():
+
+    """
+    Returns the name of the active FFT backend (see set_fft_backend).
+    """
+
+    return _fft_backend['name']
+
+
+
+def load_fft_wisdom(wisdom_file):
+
+    """
+    Loads the FFTW plans saved by save_fft_wisdom into pyFFTW. Missing or unreadable files are ignored.
+
+    Parameters:
+
+    * wisdom_file: string
+        wisdom file name
+
+    Returns:
+
+    * loaded: boolean
+        True if the wisdom was loaded
+    """
+
+    import pyfftw
+
+    try:
+        with open(wisdom_file, 'rb') as f:
+            pyfftw.import_wisdom(pickle.load(f))
+    except (IOError, OSError, EOFError, ValueError, pickle.UnpicklingError):
+        return False
+
+    return True
+
+
+
+def save_fft_wisdom(wisdom_file=None):
+
+    """
+    Saves the FFTW plans computed by pyFFTW in this session.
+
+    Parameters:
+
+    * wisdom_file: string
+        wisdom file name, by default the one given to set_fft_backend
+    """
+
+    wisdom_file = wisdom_file or _fft_backend['wisdom_file']
+
+    if wisdom_file is None or _fft_backend['name'] != 'pyfftw':
+        return
+
+    import pyfftw
+
+    with open(wisdom_file, 'wb') as f:
+        pickle.dump(pyfftw.export_wisdom(), f, protocol=2)
+
+
+
+atexit.register(save_fft_wisdom)
+
+
+
+@profiling.profiled('forward_fft')
+def _forward_fft(padded, rfft=False):
+
+    """
+    Two-dimensional discrete Fourier transform of a real padded grid with the active backend: full spectrum (fft2) or half 
+    spectrum (rfft2). The spectrum of a single precision grid is complex64 (np.fft before NumPy 2.0 computes it in double precision).
+    """
+
+    module, kwargs = _fft_backend['module'], _fft_backend['kwargs']
+
+    if rfft:
+        spectrum = module.rfft2(padded, **kwargs)
+    else:
+        spectrum = module.fft2(padded, **kwargs)
+
+    return spectrum.astype(np.result_type(padded.dtype, np.complex64), copy=False)
+
+
+
+@profiling.profiled('inverse_fft')
+def _inverse_fft(spectrum, padshape, rfft=False, overwrite=False, packed=False):
+
+    """
+    Real part of the two-dimensional inverse discrete Fourier transform over the last two axes of a full (ifft2) or half (irfft2) 
+    spectrum with the active backend. With overwrite=True, the 'scipy' backend may use the spectrum as workspace. With packed=True 
+    (full spectrum), the complex transform is returned: its real and imaginary parts are two real grids (see _packed_filter).
+    """
+
+    module, kwargs = _fft_backend['module'], _fft_backend['kwargs']
+
+    if overwrite and _fft_backend['name'] == 'scipy':
+        kwargs = dict(kwargs, overwrite_x=True)
+
+    # Same precision as the spectrum
+    dtype = np.finfo(spectrum.dtype).dtype
+
+    if rfft:
+        return module.irfft2(spectrum, s=padshape, axes=(-2, -1), **kwargs).astype(dtype, copy=False)
+
+    if packed:
+        return module.ifft2(spectrum, axes=(-2, -1), **kwargs).astype(np.result_type(dtype, np.complex64), copy=False)
+
+    return np.real(module.ifft2(spectrum, axes=(-2, -1), **kwargs)).astype(dtype, copy=False)
+
+
+
+def _odd_nyquist(spectrum, padshape, odd_y=False):
+
+    """
+    Zeroes the x-direction Nyquist row of a half spectrum filtered by an odd function of kx. The real part of the full inverse 
+    transform cancels this row (the Hermitian part of an odd filter vanishes there), but np.fft.irfft2 would keep it.
+
+    If the filter is also odd in ky, the Hermitian part keeps the corner of the row at the y-direction Nyquist frequency, where the 
+    half spectrum (positive Nyquist frequency) has the filter of opposite sign: the corner is kept with the sign changed.
+    """
+
+    if padshape[0] % 2 == 0:
+
+        row = padshape[0] // 2
+
+        if odd_y and padshape[1] % 2 == 0:
+            corner = -spectrum[..., row, -1]
+            spectrum[..., row, :] = 0
+            spectrum[..., row, -1] = corner
+        else:
+            spectrum[..., row, :] = 0
+
+    return spectrum
+
+
+
+class PreparedGrid(object):
+
+    """
+    Padded data set, spectrum and wavenumbers of a grid, computed once by prepare_grid and shared by the filtering functions.
+
+    The arrays are read-only, because the same object is returned by the cache to every function that filters the grid.
+
+    Attributes:
+
+    * shape: tuple = (nx, ny)
+        data points number in each direction before padding
+    * spacing: tuple = (dx, dy)
+        grid spacing in x- and y-directions
+    * padding: string, integer or tuple
+        padding mode (see pad_data)
+    * rfft: boolean
+        True if the spectrum is the half spectrum of np.fft.rfft2
+    * dtype: data type
+        real type of the padded data and wavenumbers (np.float64, or np.float32 in the single precision mode)
+    * padded: 2D-array
+        data set padded (3D-array for a stack of data sets)
+    * padx, pady: integer
+        number of points padded before the data in x- and y-directions
+    * spectrum: 2D-array
+        discrete Fourier transform of the padded data set (over the last two axes)
+    * kx, ky, kz: 2D-array
+        wavenumbers in x-, y- and z-directions
+    * nbytes: integer
+        memory held by the arrays
+    """
+
+    def __init__(self, data, shape, spacing, padding='square', rfft=False, dtype=None):
+
+        self.shape = tuple(shape)
+        self.spacing = tuple(spacing)
+        self.padding = padding
+        self.rfft = rfft
+
+        # Fills the matriz edges
+        self.padded, self.padx, self.pady = pad_data(data, self.shape, padding, dtype)
+        self.padshape = self.padded.shape[-2:]
+        self.dtype = np.result_type(self.padded.dtype, np.float32)
+
+        self.spectrum = _forward_fft(self.padded, rfft)
+
+        # Wavenumbers in x-, y- and z-directions, in the precision of the data so that the filters do not promote the spectrum
+        self.kx, self.ky = [k.astype(self.dtype) for k in _wavenumbers(self.spacing, self.padshape, half=rfft)]
+        self.kz = np.sqrt(self.kx ** 2 + self.ky ** 2)
+
+        self.nbytes = 0
+
+        for array in (self.padded, self.spectrum, self.kx, self.ky, self.kz):
+            array.flags.writeable = False
+            self.nbytes += array.nbytes
+
+    def crop(self, array):
+
+        """
+        Removes the padding of a grid (or of a stack of grids on the last two axes) with the padded shape.
+        """
+
+        nx, ny = self.shape
+
+        return array[..., self.padx: self.padx + nx, self.pady: self.pady + ny]
+
+    def data(self):
+
+        """
+        Returns the data set (2D-array) without the padding.
+        """
+
+        return self.crop(self.padded)
+
+
+
+@profiling.profiled('prepare_grid')
+def prepare_grid(x, y, data, shape, padding='square', rfft=False, dtype=None):
+
+    """
+    Pads and transforms a data set, and computes its wavenumbers. The result is cached: the functions of this module call 
+    prepare_grid, so each grid is transformed only once per session while it stays in the cache. The cache key is made of the shape, 
+    the grid spacing, the padding mode, the kind of transform and a hash of the data values. The least recently used grids are 
+    evicted when the cache exceeds its size (see set_grid_cache_size). A grid larger than the cache (or any grid when the cache is 
+    disabled) is prepared without hashing its values.
+
+    The returned object can be passed in place of the data set to nonregularized_derivative, regularized_derivative and s_function 
+    (its padding mode is then used).
+
+    Parameters:
+
+    * x, y: 1D-array
+        coordinates mesh in x- and y-directions
+    * data: 1D-array or PreparedGrid
+        input data set
+    * shape: tuple = (nx, ny)
+        data points number in each direction 
+    * padding: string, integer or tuple
+        padding mode (see pad_data)
+    * rfft: boolean
+        if True, the spectrum is the half spectrum of the real-to-complex transform (np.fft.rfft2)
+    * dtype: data type
+        np.float32 processes the grid in single precision (float32 data, complex64 spectrum); None keeps the type of the data
+
+    Returns:
+
+    * grid: PreparedGrid
+        padded data set, spectrum and wavenumbers
+    """
+
+    if isinstance(data, PreparedGrid):
+
+        if data.rfft == rfft and (dtype is None or data.dtype == dtype):
+            return data
+
+        shape, spacing, padding, data = data.shape, data.spacing, data.padding, data.data()
+
+    else:
+        spacing = _grid_spacing(x, y, shape)
+
+    if _grid_nbytes(data, shape, padding, rfft, dtype) > _grid_cache_size['max_bytes']:
+
+        # The grid would not be cached: the hash of the key is not needed
+        return PreparedGrid(np.reshape(data, shape), shape, spacing, padding, rfft, dtype)
+
+    data, key = _data_key(data, shape, spacing, padding, dtype)
+    padding = key[2]
+    key = key + (bool(rfft),)
+
+    grid = _grid_cache.pop(key, None)
+
+    if grid is None:
+        grid = PreparedGrid(data, shape, spacing, padding, rfft)
+
+    if grid.nbytes <= _grid_cache_size['max_bytes']:
+
+        # Most recently used grid at the end
+        _grid_cache[key] = grid
+
+        while sum(cached.nbytes for cached in _grid_cache.values()) > _grid_cache_size['max_bytes']:
+            _grid_cache.popitem(last=False)
+
+    return grid
+
+
+
+def _grid_nbytes(data, shape, padding='square', rfft=False, dtype=None):
+
+    """
+    Memory held by the arrays of the PreparedGrid of a data set (see PreparedGrid.nbytes), computed without preparing it.
+    """
+
+    real = np.dtype(np.asarray(data).dtype if dtype is None else dtype)
+
+    (before_x, after_x), (before_y, after_y) = _pad_widths(shape, padding)
+    padshape = (shape[0] + before_x + after_x, shape[1] + before_y + after_y)
+
+    # The spectrum and the wavenumbers have the size of the half spectrum with the real-to-complex transform
+    points = padshape[0] * padshape[1]
+    spectrum = padshape[0] * (padshape[1] // 2 + 1) if rfft else points
+
+    return (points * real.itemsize + spectrum * np.result_type(real, np.complex64).itemsize +
+            3 * spectrum * np.result_type(real, np.float32).itemsize)
+
+
+
+def _data_key(data, shape, spacing, padding, dtype=None):
+
+    """
+    Returns the data set as a contiguous 2D-array of the given type, and the key identifying it with its geometry: shape, grid 
+    spacing, padding mode, type and hash (SHA-1) of the values.
+    """
+
+    data = np.ascontiguousarray(data, dtype=dtype).reshape(shape)
+
+    # Hashable padding widths
+    if isinstance(padding, (list, tuple, np.ndarray)):
+        padding = tuple(int(width) for width in padding)
+
+    key = (tuple(shape), tuple(float(d) for d in spacing), padding, data.dtype.str, hashlib.sha1(data.view(np.uint8)).hexdigest())
+
+    return data, key
+
+
+
+def set_grid_cache_size(max_bytes):
+
+    """
+    Sets the maximum memory held by the cache of prepared grids (see prepare_grid). Zero disables the cache.
+
+    Parameters:
+
+    * max_bytes: integer
+        maximum size of the cache in bytes
+    """
+
+    _grid_cache_size['max_bytes'] = max_bytes
+
+    while _grid_cache and sum(cached.nbytes for cached in _grid_cache.values()) > max_bytes:
+        _grid_cache.popitem(last=False)
+
+
+
+def clear_grid_cache():
+
+    """
+    Removes all the prepared grids from the cache.
+    """
+
+    _grid_cache.clear()
+
+
+
+def set_norm_cache(directory, max_bytes=64 * 2 ** 20):
+
+    """
+    Enables the on-disk cache of the S-function norms of s_function_norms and s_function ('fft' and 'spectral' methods), so that 
+    runs on the same grid (e.g. to change the limits of the S-function's linear variation interval or to re-plot) do not compute 
+    them again.
+
+    Each grid has one file in the cache folder, named by a hash of its values, shape, grid spacing, padding mode, type, method and 
+    kind of transform, holding the norms of all the trial regularization parameters evaluated so far. Only the parameters that are 
+    not in the file are computed, so extending the range of alpha_test computes only the new values. The least recently used files 
+    are removed when the folder exceeds its size.
+
+    The cache is disabled by default. It can also be enabled by the environment variable STAIRCASE_CACHE, whose value is the cache 
+    folder (e.g. STAIRCASE_CACHE=cache python real_data.py).
+
+    Parameters:
+
+    * directory: string
+        cache folder, created if needed (None disables the cache)
+    * max_bytes: integer
+        maximum size of the cache files in bytes
+    """
+
+    if directory is not None and not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    _norm_cache['directory'] = directory
+    _norm_cache['max_bytes'] = max_bytes
+
+    if directory is not None:
+        _evict_norms()
+
+
+
+def clear_norm_cache():
+
+    """
+    Removes all the files of the on-disk cache of the S-function norms (see set_norm_cache).
+    """
+
+    if _norm_cache['directory'] is not None:
+
+        for filename in _norm_files():
+            os.remove(filename)
+
+
+
+def _norm_files():
+
+    """
+    Returns the file names of the on-disk cache of the S-function norms.
+    """
+
+    directory = _norm_cache['directory']
+
+    return [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.npy')]
+
+
+
+def _evict_norms(keep=None):
+
+    """
+    Removes the least recently used files of the cache of the S-function norms until the cache fits in its size, except 'keep'.
+    """
+
+    entries = []
+
+    for filename in _norm_files():
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, filename))
+
+    total = sum(size for _, size, _ in entries)
+
+    for _, size, filename in sorted(entries):
+
+        if total <= _norm_cache['max_bytes']:
+            break
+
+        if filename != keep:
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            total -= size
+
+
+
+# The cache is enabled without changing the code by the environment variable STAIRCASE_CACHE, whose value is the cache folder
+if os.environ.get('STAIRCASE_CACHE'):
+    set_norm_cache(os.environ['STAIRCASE_CACHE'])
+
+
+
+def _cached_norms(x, y, data, shape, alpha, batch_size, method, rfft, padding, n_jobs, parallel, dtype):
+
+    """
+    Returns the S-function norms ('fft' or 'spectral' method) from the on-disk cache, computing and storing only the trial 
+    regularization parameters that are not in it (see set_norm_cache).
+    """
+
+    if isinstance(data, PreparedGrid):
+        key_shape, spacing, key_padding, values = data.shape, data.spacing, data.padding, data.data()
+    else:
+        key_shape, spacing, key_padding, values = shape, _grid_spacing(x, y, shape), padding, data
+
+    # The spectral norms do not depend on the kind of transform
+    # The padding is identified by its widths, so that a change of the padded shape of a mode gives another file
+    widths = np.ravel(_pad_widths(key_shape, key_padding))
+    key = _data_key(values, key_shape, spacing, widths, dtype)[1] + (method, bool(rfft) and method == 'fft')
+    filename = os.path.join(_norm_cache['directory'], hashlib.sha1(repr(key).encode()).hexdigest() + '.npy')
+
+    # Trial parameters (first row, increasing) and norms of the x-, y- and z-derivatives (other rows)
+    try:
+        cached = np.load(filename)
+    except (OSError, ValueError, EOFError):
+        cached = np.empty((4, 0))
+
+    def lookup():
+        index = np.minimum(np.searchsorted(cached[0], alpha), max(cached.shape[1] - 1, 0))
+        found = np.isclose(cached[0][index], alpha, rtol=1e-12, atol=0) if cached.shape[1] else np.zeros(alpha.size, bool)
+        return index, found
+
+    index, found = lookup()
+
+    if np.all(found):
+
+        # Most recently used
+        try:
+            os.utime(filename, None)
+        except OSError:
+            pass
+
+        return cached[1:, index]
+
+    new = np.unique(alpha[~found])
+
+    if method == 'fft':
+        norms = _fft_norms(prepare_grid(x, y, data, shape, padding, rfft, dtype), new, batch_size, n_jobs, parallel)
+    else:
+        norms = _spectral_norms(prepare_grid(x, y, data, shape, padding, False, dtype), new)
+
+    cached = np.concatenate([cached, np.vstack([new, norms])], axis=1)
+    cached = cached[:, np.argsort(cached[0], kind='stable')]
+
+    # Written to a temporary file and renamed, so that other processes never read a partial file
+    descriptor, temporary = tempfile.mkstemp(suffix='.tmp', dir=_norm_cache['directory'])
+
+    with os.fdopen(descriptor, 'wb') as f:
+        np.save(f, cached)
+
+    os.replace(temporary, filename)
+    _evict_norms(keep=filename)
+
+    return cached[1:, lookup()[0]]
+
+
+
+def _workspace(work, shape, dtype):
+
+    """
+    Returns an array of the given shape and type from the dictionary of workspace arrays 'work', creating it on first use, so that 
+    repeated calls on grids of the same size reuse the same memory.
+    """
+
+    key = (tuple(shape), np.dtype(dtype).str)
+
+    if key not in work:
+        work[key] = np.empty(shape, dtype=dtype)
+
+    return work[key]
+
+
+
+def _write(target, values):
+
+    """
+    Copies values into a preallocated output array with the same number of elements (e.g. a 1D-array receiving a 2D grid).
+    """
+
+    view = target.reshape(values.shape)
+
+    if not np.may_share_memory(view, target):
+        raise ValueError("the output arrays must be contiguous")
+
+    view[...] = values
+
+    return target
+
+
+
+def _packed_filter(gamma_a, gamma_b):
+
+    """
+    Combines two filters as hermitian_a + i*hermitian_b (see _hermitian_part). For a real data set, the inverse transform of 
+    spectrum * combined filter has the real part of the inverse transform of spectrum * gamma_a as real part and the one of 
+    spectrum * gamma_b as imaginary part: two filtered grids cost one full inverse transform.
+    """
+
+    # Constant filters (e.g. the derivative of order zero) are their own Hermitian part
+    hermitian_a = _hermitian_part(gamma_a) if np.ndim(gamma_a) >= 2 else gamma_a
+    hermitian_b = _hermitian_part(gamma_b) if np.ndim(gamma_b) >= 2 else gamma_b
+
+    return hermitian_a + 1j * hermitian_b
+
+
+
+def _filter_grid(grid, filters, out=None, work=None):
+
+    """
+    Applies a sequence of (filter, (odd in kx, odd in ky)) pairs to the spectrum of a PreparedGrid and returns the filtered grids 
+    without the padding. The filtered spectra are computed one at a time in the same workspace array, and the results are written 
+    in the 'out' arrays if given.
+
+    On the full spectrum, a filter odd in kx only followed by a filter odd in ky only (e.g. the x- and y-derivatives) are applied 
+    with one inverse transform (see _packed_filter), so that the three derivatives take two inverse transforms instead of three. 
+    The rounding errors of the packed pair follow the larger of the two grids, which are of similar size for such pairs.
+    """
+
+    results = []
+    work = {} if work is None else work
+
+    filters = list(filters)
+    i = 0
+
+    while i < len(filters):
+
+        pair = not grid.rfft and [parity for _, parity in filters[i:i + 2]] == [(True, False), (False, True)]
+        group = filters[i:i + 2] if pair else filters[i:i + 1]
+        i += len(group)
+
+        if pair:
+            gamma = _packed_filter(group[0][0], group[1][0])
+        else:
+            gamma = group[0][0]
+
+        deriv_fft = _workspace(work, np.broadcast(grid.spectrum, gamma).shape, np.result_type(grid.spectrum, gamma))
+
+        np.multiply(grid.spectrum, gamma, out=deriv_fft)
+
+        odd_x, odd_y = group[0][1]
+
+        if grid.rfft and odd_x:
+            _odd_nyquist(deriv_fft, grid.padshape, odd_y)
+
+        # Two-dimensional inverse discrete Fourier transform, without the padding: real part, or both parts of a packed pair
+        if pair:
+            packed = grid.crop(_inverse_fft(deriv_fft, grid.padshape, overwrite=True, packed=True))
+            derivs = [packed.real, packed.imag]
+        else:
+            derivs = [grid.crop(_inverse_fft(deriv_fft, grid.padshape, grid.rfft, overwrite=True))]
+
+        for j, deriv in enumerate(derivs, i - len(group)):
+
+            if out is not None:
+                deriv = _write(out[j], deriv)
+            elif np.may_share_memory(deriv, deriv_fft):
+                # The transform was computed in place: the workspace is reused by the next filter
+                deriv = deriv.copy()
+
+            results.append(deriv)
+
+    return results
+
+
+
+@profiling.profiled('nonregularized_derivative')
+def nonregularized_derivative(x, y, data, shape, order, rfft=False, padding='square', dtype=None, out=None):
+
+    """
+    Computes the non-regularized derivatives in the Fourier domain in the x-, y-, and z-directions using equation 3 of the paper.
+
+    Based on Fatiando a Terra package (https://www.fatiando.org/).
+
+    Parameters:
+
+    * x, y: 1D-array
+        coordinates mesh in x- and y-directions
+    * data: 1D-array or PreparedGrid
+        input data set (see prepare_grid)
+    * shape: tuple = (nx, ny)
+        data points number in each direction 
+    * order: integer
+        derivative order
+    * rfft: boolean
+        if True, uses the real-to-complex transforms (np.fft.rfft2 and np.fft.irfft2), which compute only half of the spectrum
+    * padding: string, integer or tuple
+        padding mode (see pad_data)
+    * dtype: data type
+        np.float32 computes in single precision (see prepare_grid); None keeps the type of the data
+    * out: tuple = (dx, dy, dz)
+        contiguous arrays with nx*ny elements that receive the derivatives, e.g. reused across calls; new arrays if None
+
+    Returns:
+
+    * dx, dy, dz: 1D-array
+        derivatives in x-, y- and z-directions (the out arrays if given)
+    """
+
+    # Padded data set, spectrum and wavenumbers in x-, y- and z-directions
+    grid = prepare_grid(x, y, data, shape, padding, rfft, dtype)
+
+    if out is not None:
+        return tuple(_grid_nonregularized_derivative(grid, order, out))
+
+    derivx, derivy, derivz = _grid_nonregularized_derivative(grid, order)
+
+    # Converts a matrix to a 1D vector
+    dx = np.ravel(derivx)
+    dy = np.ravel(derivy)
+    dz = np.ravel(derivz)
+
+    return dx, dy, dz
+
+
+
+def _grid_nonregularized_derivative(grid, order, out=None, work=None):
+
+    """
+    Non-regularized derivatives (2D-arrays without the padding) of a PreparedGrid.
+    """
+
+    # kx only varies along the rows and ky along the columns: their filters are computed on one column and one row
+    kx, ky = grid.kx[..., :1], grid.ky[..., :1, :]
+
+    filters = (((kx * 1j) ** order, (order % 2 == 1, False)), ((ky * 1j) ** order, (False, order % 2 == 1)),
+               (grid.kz ** order, (False, False)))
+
+    return _filter_grid(grid, filters, out, work)
+
+
+
+def _direction_alphas(alpha):
+
+    """
+    Regularization parameters of the x-, y- and z-directions: a sequence of three values, or one value (float or array) common to 
+    the three directions.
+    """
+
+    if isinstance(alpha, (list, tuple)) or (isinstance(alpha, np.ndarray) and alpha.shape == (3,)):
+
+        if len(alpha) != 3:
+            raise ValueError("alpha must be a float or a sequence of three values (x, y, z), not %r" % (alpha,))
+
+        return tuple(alpha)
+
+    return alpha, alpha, alpha
+
+
+
+def regularized_filters(kx, ky, alpha):
+
+    """
+    Computes the spectral characteristic low pass filters of the regularized first-order derivatives using equation 5 of the paper.
+
+    The regularization parameter can be a float or an array broadcastable against the wavenumbers, e.g. with shape (n, 1, 1) to 
+    build the filters of n trial regularization parameters at once, or a tuple of three such values (one per direction).
+
+    Parameters:
+
+    * kx, ky: 2D-array
+        wavenumbers in x- and y-directions
+    * alpha: float, array or tuple = (alpha_x, alpha_y, alpha_z)
+        regularization parameter, common or one per direction
+
+    Returns:
+
+    * gamma_x, gamma_y, gamma_z: 2D- or 3D-array
+        filters of the x-, y- and z-derivatives
+    """
+
+    alpha_x, alpha_y, alpha_z = _direction_alphas(alpha)
+
+    gamma_x = _regularized_filter(kx, ky, alpha_x, 0)
+    gamma_y = _regularized_filter(kx, ky, alpha_y, 1)
+    gamma_z = _regularized_filter(kx, ky, alpha_z, 2)
+
+    return gamma_x, gamma_y, gamma_z
+
+
+
+def _regularized_filter(kx, ky, alpha, direction):
+
+    """
+    Filter of the regularized first-order derivative in the x- (direction = 0), y- (1) or z-direction (2).
+    """
+
+    # The filter has the precision of the wavenumbers
+    alpha = np.asarray(alpha, dtype=np.result_type(kx, np.float32))
+
+    if direction == 0:
+        return ((1j) * kx) / (1 + alpha * (kx ** 2))
+
+    if direction == 1:
+        return ((1j) * ky) / (1 + alpha * (ky ** 2))
+
+    kz = np.sqrt(kx ** 2 + ky ** 2)
+
+    return kz / (1 + alpha * (kz ** 2))
+
+
+
+@profiling.profiled('regularized_derivative')
+def regularized_derivative(x, y, data, shape, alpha, rfft=False, padding='square', dtype=None, out=None):
+
+    """
+    Computes the regularized first-order derivatives in the Fourier domain in the x-, y-, and z-directions using equation 5 of the paper.
+
+    Each direction can have its own regularization parameter, e.g. the alpha_x, alpha_y and alpha_z chosen on the S-function instead 
+    of their mean. Several choices can be compared in one call with a list of (alpha_x, alpha_y, alpha_z) triples: the data set is 
+    transformed once and each triple costs three inverse transforms.
+
+    Parameters:
+
+    * x, y: 1D-array
+        coordinates mesh in x- and y-directions
+    * data: 1D-array or PreparedGrid
+        input data set (see prepare_grid)
+    * shape: tuple = (nx, ny)
+        data points number in each direction 
+    * alpha: float, tuple = (alpha_x, alpha_y, alpha_z) or 2D-array = (m, 3)
+        regularization parameter, common or one per direction, or m triples of parameters
+    * rfft: boolean
+        if True, uses the real-to-complex transforms (np.fft.rfft2 and np.fft.irfft2), which compute only half of the spectrum
+    * padding: string, integer or tuple
+        padding mode (see pad_data)
+    * dtype: data type
+        np.float32 computes in single precision (see prepare_grid); None keeps the type of the data
+    * out: tuple = (dx, dy, dz)
+        contiguous arrays with nx*ny elements (m x nx*ny for m triples) that receive the derivatives, e.g. reused across calls; new 
+        arrays if None
+
+    Returns:
+
+    * dx, dy, dz: 1D-array (2D-array = (m, nx*ny) for m triples)
+        derivatives in x-, y- and z-directions (the out arrays if given)
+    """
+    
+    # Padded data set, spectrum and wavenumbers in x- and y-directions (the spectrum is shared by the three filters)
+    grid = prepare_grid(x, y, data, shape, padding, rfft, dtype)
+
+    if np.ndim(alpha) == 2:
+
+        triples = np.asarray(alpha)
+
+        if triples.shape[1] != 3:
+            raise ValueError("alpha triples must have shape (m, 3), not %s" % (triples.shape,))
+
+        if out is None:
+            out = tuple(np.empty((len(triples), np.prod(shape)), dtype=grid.dtype) for i in range(3))
+
+        # The filtered spectra of all the triples share one workspace
+        work = {}
+
+        for i, triple in enumerate(triples):
+            _grid_regularized_derivative(grid, tuple(triple), [deriv[i] for deriv in out], work)
+
+        return tuple(out)
+
+    if out is not None:
+        return tuple(_grid_regularized_derivative(grid, alpha, out))
+
+    derivx, derivy, derivz = _grid_regularized_derivative(grid, alpha)
+
+    # Converts a matrix to a 1D vector
+    dy = np.ravel(derivy)
+    dx = np.ravel(derivx)
+    dz = np.ravel(derivz)
+
+    return dx, dy, dz
+
+
+
+def _grid_regularized_derivative(grid, alpha, out=None, work=None):
+
+    """
+    Regularized first-order derivatives (2D-arrays without the padding) of a PreparedGrid.
+    """
+
+    # kx only varies along the rows and ky along the columns: their filters are computed on one column and one row
+    kx, ky = grid.kx[..., :1], grid.ky[..., :1, :]
+
+    # Spectral characteristic low pass filter
+    gamma_x, gamma_y, gamma_z = regularized_filters(kx, ky, alpha)
+
+    return _filter_grid(grid, ((gamma_x, (True, False)), (gamma_y, (False, True)), (gamma_z, (False, False))), out, work)
+
+
+
+def regularized_filter_bank(kx, ky, orders, alpha):
+
+    """
+    Computes the filters of regularized derivatives of any order. The derivative of order (nx, ny, nz) applies the regularized 
+    first-order derivative of equation 5 of the paper nx times in the x-direction, ny times in the y-direction and nz times in the 
+    z-direction:
+
+        (i*kx / (1 + alpha_x*kx**2))**nx * (i*ky / (1 + alpha_y*ky**2))**ny * (kz / (1 + alpha_z*kz**2))**nz
+
+    so that the order (1, 0, 0) is the filter gamma_x of regularized_filters, and alpha = 0 gives the non-regularized derivatives.
+
+    Parameters:
+
+    * kx, ky: 2D-array
+        wavenumbers in x- and y-directions
+    * orders: list
+        derivative orders, tuples = (nx, ny, nz), e.g. (0, 0, 2) for the second vertical derivative
+    * alpha: float or tuple = (alpha_x, alpha_y, alpha_z)
+        regularization parameter, common or one per direction
+
+    Returns:
+
+    * filters: list
+        filters of the derivatives, in the order of orders
+    """
+
+    alphas = _direction_alphas(alpha)
+
+    filters = []
+
+    for order in orders:
+
+        if len(order) != 3 or min(order) < 0:
+            raise ValueError("derivative orders must be tuples of three non-negative integers, not %r" % (order,))
+
+        gamma = 1
+
+        for direction, n in enumerate(order):
+            if n > 0:
+                gamma = gamma * _regularized_filter(kx, ky, alphas[direction], direction) ** n
+
+        filters.append(gamma)
+
+    return filters
+
+
+
+@profiling.profiled('regularized_derivatives')
+def regularized_derivatives(x, y, data, shape, orders, alpha, rfft=False, padding='square', dtype=None):
+
+    """
+    Computes a set of regularized derivatives of any order (see regularized_filter_bank) from a single padded and transformed data 
+    set: one inverse transform per derivative.
+
+    Parameters:
+
+    * x, y: 1D-array
+        coordinates mesh in x- and y-directions
+    * data: 1D-array or PreparedGrid
+        input data set (see prepare_grid)
+    * shape: tuple = (nx, ny)
+        data points number in each direction 
+    * orders: list
+        derivative orders, tuples = (nx, ny, nz)
+    * alpha: float or tuple = (alpha_x, alpha_y, alpha_z)
+        regularization parameter, common or one per direction
+    * rfft: boolean
+        if True, uses the real-to-complex transforms
+    * padding: string, integer or tuple
+        padding mode (see pad_data)
+    * dtype: data type
+        np.float32 computes in single precision (see prepare_grid); None keeps the type of the data
+
+    Returns:
+
+    * derivs: list
+        derivatives (1D-arrays), in the order of orders
+    """
+
+    grid = prepare_grid(x, y, data, shape, padding, rfft, dtype)
+
+    return [np.ravel(deriv) for deriv in _grid_regularized_derivatives(grid, orders, alpha)]
+
+
+
+def _grid_regularized_derivatives(grid, orders, alpha, out=None, work=None):
+
+    """
+    Regularized derivatives of any order (2D-arrays without the padding) of a PreparedGrid.
+    """
+
+    # kx only varies along the rows and ky along the columns: the filters of one direction are computed on one column or row
+    kx, ky = grid.kx[..., :1], grid.ky[..., :1, :]
+
+    filters = regularized_filter_bank(kx, ky, orders, alpha)
+
+    # Parity of the filters in kx and ky
+    parities = [(order[0] % 2 == 1, order[1] % 2 == 1) for order in orders]
+
+    return _filter_grid(grid, list(zip(filters, parities)), out, work)
+
+
+
+# Derivative orders (nx, ny, nz) needed by each product of regularized_products
+_product_orders = {'dx': [(1, 0, 0)], 'dy': [(0, 1, 0)], 'dz': [(0, 0, 1)], 'dzz': [(0, 0, 2)],
+                   'thg': [(1, 0, 0), (0, 1, 0)],
+                   'asa': [(1, 0, 0), (0, 1, 0), (0, 0, 1)],
+                   'tdr': [(1, 0, 0), (0, 1, 0), (0, 0, 1)],
+                   'theta': [(1, 0, 0), (0, 1, 0), (0, 0, 1)],
+                   'tilt_of_tilt': [(1, 0, 0), (0, 1, 0), (0, 0, 1), (2, 0, 0), (1, 1, 0), (0, 2, 0), (1, 0, 1), (0, 1, 1),
+                                    (0, 0, 2)]}
+
+
+
+@profiling.profiled('regularized_products')
+def regularized_products(x, y, data, shape, alpha, products=('dzz', 'thg', 'theta', 'tilt_of_tilt'), rfft=False,
+                         padding='square', dtype=None):
+
+    """
+    Computes derived products of the regularized derivatives from a single padded and transformed data set. Each derivative needed 
+    by the requested products is computed once (see regularized_derivatives). The products are:
+
+    - 'dx', 'dy', 'dz': first-order derivatives
+    - 'dzz': second vertical derivative
+    - 'thg': total horizontal gradient, sqrt(dx**2 + dy**2)
+    - 'asa': analytical signal amplitude (equation 1 of the paper)
+    - 'tdr': tilt derivative (equation 2 of the paper)
+    - 'theta': theta map, arccos(thg / asa)
+    - 'tilt_of_tilt': tilt derivative of the tilt derivative. The derivatives of the tilt derivative are computed by the chain rule 
+      from the first- and second-order derivatives of the data set, without transforming the tilt derivative.
+
+    Parameters:
+
+    * x, y: 1D-array
+        coordinates mesh in x- and y-directions
+    * data: 1D-array or PreparedGrid
+        input data set (see prepare_grid)
+    * shape: tuple = (nx, ny)
+        data points number in each direction 
+    * alpha: float or tuple = (alpha_x, alpha_y, alpha_z)
+        regularization parameter, common or one per direction
+    * products: list
+        names of the products
+    * rfft: boolean
+        if True, uses the real-to-complex transforms
+    * padding: string, integer or tuple
+        padding mode (see pad_data)
+    * dtype: data type
+        np.float32 computes in single precision (see prepare_grid); None keeps the type of the data
+
+    Returns:
+
+    * results: dictionary
+        products (1D-arrays) by name
+    """
+
+    unknown = [name for name in products if name not in _product_orders]
+
+    if unknown:
+        raise ValueError("unknown products %s, the products are %s" % (unknown, sorted(_product_orders)))
+
+    orders = []
+
+    for name in products:
+        orders.extend(order for order in _product_orders[name] if order not in orders)
+
+    d = dict(zip(orders, regularized_derivatives(x, y, data, shape, orders, alpha, rfft, padding, dtype)))
+
+    results = {}
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+
+        if (1, 0, 0) in d:
+            dx, dy, dz = d[(1, 0, 0)], d[(0, 1, 0)], d.get((0, 0, 1))
+            thg = np.sqrt(dx ** 2 + dy ** 2)
+
+        for name in products:
+
+            if name in ('dx', 'dy', 'dz', 'dzz'):
+                results[name] = d[_product_orders[name][0]]
+
+            elif name == 'thg':
+                results[name] = thg
+
+            elif name == 'asa':
+                results[name] = np.sqrt(thg ** 2 + dz ** 2)
+
+            elif name == 'tdr':
+                results[name] = np.arctan2(dz, thg)
+
+            elif name == 'theta':
+                # cos(theta) = thg / asa, computed without the division
+                results[name] = np.arctan2(np.abs(dz), thg)
+
+            elif name == 'tilt_of_tilt':
+
+                # Derivatives of the total horizontal gradient
+                thg_x = (dx * d[(2, 0, 0)] + dy * d[(1, 1, 0)]) / thg
+                thg_y = (dx * d[(1, 1, 0)] + dy * d[(0, 2, 0)]) / thg
+                thg_z = (dx * d[(1, 0, 1)] + dy * d[(0, 1, 1)]) / thg
+
+                # Derivatives of the tilt derivative, arctan(dz / thg)
+                asa2 = thg ** 2 + dz ** 2
+                tdr_x = (thg * d[(1, 0, 1)] - dz * thg_x) / asa2
+                tdr_y = (thg * d[(0, 1, 1)] - dz * thg_y) / asa2
+                tdr_z = (thg * d[(0, 0, 2)] - dz * thg_z) / asa2
+
+                results[name] = np.arctan2(tdr_z, np.sqrt(tdr_x ** 2 + tdr_y ** 2))
+
+    return results
+
+
+
+def reduction_to_pole_filter(kx, ky, inc, dec, mag_inc=None, mag_dec=None):
+
+    """
+    Computes the transfer function of the reduction to the pole of total-field anomaly data:
+
+        1 / (theta_m * theta_f),    theta = cos(I)*cos(D)*i*kx/k + cos(I)*sin(D)*i*ky/k + sin(I)
+
+    for the directions of the geomagnetic field (f) and of the magnetization (m), with the x-axis to the north, the y-axis to the 
+    east and the z-axis down. The zero wavenumber (mean value) is set to zero. The filter grows without bound in the directions 
+    where theta vanishes, which at low inclinations are close to the wavenumbers perpendicular to the declination.
+
+    Parameters:
+
+    * kx, ky: 2D-array
+        wavenumbers in x- and y-directions
+    * inc, dec: float
+        inclination and declination of the geomagnetic field (degrees)
+    * mag_inc, mag_dec: float
+        inclination and declination of the magnetization (degrees); None: induced magnetization (field direction)
+
+    Returns:
+
+    * rtp: 2D-array
+        filter of the reduction to the pole
+    """
+
+    mag_inc = inc if mag_inc is None else mag_inc
+    mag_dec = dec if mag_dec is None else mag_dec
+
+    real = np.result_type(kx, np.float32)
+    k = np.sqrt(kx ** 2 + ky ** 2)
+
+    # Wavenumbers divided by their norm, zero at the zero wavenumber
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ux = np.where(k > 0, kx / k, 0)
+        uy = np.where(k > 0, ky / k, 0)
+
+    rtp = 1
+
+    for i, d in ((inc, dec), (mag_inc, mag_dec)):
+        i, d = np.radians(i), np.radians(d)
+        fx, fy, fz = [np.asarray(value, dtype=real) for value in (np.cos(i) * np.cos(d), np.cos(i) * np.sin(d), np.sin(i))]
+        rtp = rtp * (fz + 1j * (fx * ux + fy * uy))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rtp = np.where(k > 0, 1 / rtp, 0)
+
+    return rtp
+
+
+
+def upward_continuation_filter(kx, ky, height):
+
+    """
+    Computes the transfer function of the upward continuation, exp(-height * k). A negative height continues the data downward, 
+    which amplifies the short wavelengths (and the noise).
+
+    Parameters:
+
+    * kx, ky: 2D-array
+        wavenumbers in x- and y-directions
+    * height: float
+        continuation height (m), positive upward
+
+    Returns:
+
+    * continuation: 2D-array
+        filter of the upward continuation
+    """
+
+    height = np.asarray(height, dtype=np.result_type(kx, np.float32))
+
+    return np.exp(-height * np.sqrt(kx ** 2 + ky ** 2))
+
+
+
+def _nyquist_filter(function, filtered, spectrum, kx, ky, padshape):
+
+    """
+    Sets the Nyquist row and column of a filtered half spectrum to the spectrum times the Hermitian part of the filter of the full 
+    spectrum, so that np.fft.irfft2 returns the real part of the full inverse transform (as _odd_nyquist does for the derivatives). 
+    'function' computes the filter from the wavenumbers; it must keep real data real (function(-kx, -ky) = conj(function(kx, ky))).
+    """
+
+    row = padshape[0] // 2
+
+    # Each Nyquist frequency is its own opposite: the filter is averaged over the two signs of that wavenumber. At the corner, the 
+    # full spectrum has the negative y-direction Nyquist frequency.
+    terms = []
+
+    if padshape[0] % 2 == 0:
+        terms.append(((Ellipsis, slice(row, row + 1), slice(None)), (-1, 1), (1, 1)))
+
+    if padshape[1] % 2 == 0:
+        terms.append(((Ellipsis, slice(None), slice(-1, None)), (1, -1), (1, 1)))
+
+    if padshape[0] % 2 == 0 and padshape[1] % 2 == 0:
+        terms.append(((Ellipsis, slice(row, row + 1), slice(-1, None)), (-1, 1), (1, -1)))
+
+    for index, (sx1, sy1), (sx2, sy2) in terms:
+        a, b = kx[index], ky[index]
+        filtered[index] = spectrum[index] * ((function(sx1 * a, sy1 * b) + function(sx2 * a, sy2 * b)) / 2)
+
+    return filtered
+
+
+
+class SpectralPipeline(object):
+
+    """
+    Chain of linear operators of the Fourier domain (reduction to the pole, upward continuation) whose transfer functions are 
+    multiplied into a single kernel. The kernel is also multiplied by the filters of the regularized derivatives and of the S-function, 
+    so that the whole chain costs one forward transform of the data (cached, see prepare_grid) and one inverse transform per result, 
+    instead of a forward and an inverse transform per operator:
+
+        pipeline = SpectralPipeline().reduce_to_pole(inc, dec).upward_continuation(100)
+        norm_sol_dx, norm_sol_dy, norm_sol_dz = pipeline.s_function(x, y, tfa, shape, alpha_test)
+        dx, dy, dz = pipeline.regularized_derivative(x, y, tfa, shape, alpha)
+
+    Each operator returns a new pipeline, so a common chain can be extended in several ways.
+
+    Attributes:
+
+    * operators: list
+        (name, transfer function of kx and ky) of the operators, in the order they were added
+    """
+
+    def __init__(self, operators=()):
+
+        self.operators = list(operators)
+
+    def then(self, name, function):
+
+        """
+        Returns a new pipeline with an operator added, given by its transfer function function(kx, ky), which must keep real data 
+        real (function(-kx, -ky) = conj(function(kx, ky))).
+        """
+
+        return SpectralPipeline(self.operators + [(name, function)])
+
+    def reduce_to_pole(self, inc, dec, mag_inc=None, mag_dec=None):
+
+        """
+        Returns a new pipeline with the reduction to the pole added (see reduction_to_pole_filter).
+        """
+
+        return self.then('reduce_to_pole', lambda kx, ky: reduction_to_pole_filter(kx, ky, inc, dec, mag_inc, mag_dec))
+
+    def upward_continuation(self, height):
+
+        """
+        Returns a new pipeline with the upward continuation added (see upward_continuation_filter).
+        """
+
+        return self.then('upward_continuation', lambda kx, ky: upward_continuation_filter(kx, ky, height))
+
+    def kernel(self, kx, ky):
+
+        """
+        Returns the product of the transfer functions of the operators (1 for an empty pipeline).
+        """
+
+        kernel = 1
+
+        for _, function in self.operators:
+            kernel = kernel * function(kx, ky)
+
+        return kernel
+
+    def _spectrum(self, grid):
+
+        """
+        Returns the spectrum of a PreparedGrid multiplied by the kernel.
+        """
+
+        return grid.spectrum * self.kernel(grid.kx, grid.ky)
+
+    def _inverse(self, grid, spectrum, function):
+
+        """
+        Multiplies the spectrum of a PreparedGrid times the kernel (see _spectrum) by a filter of kx and ky, and returns the real 
+        filtered grid(s) without the padding.
+        """
+
+        # kx only varies along the rows and ky along the columns
+        filtered = spectrum * function(grid.kx[..., :1], grid.ky[..., :1, :])
+
+        if grid.rfft:
+            _nyquist_filter(lambda kx, ky: self.kernel(kx, ky) * function(kx, ky), filtered, grid.spectrum, grid.kx, grid.ky,
+                            grid.padshape)
+
+        return grid.crop(_inverse_fft(filtered, grid.padshape, grid.rfft, overwrite=True))
+
+    def apply(self, x, y, data, shape, rfft=False, padding='square', dtype=None):
+
+        """
+        Applies the operators to a data set.
+
+        Parameters:
+
+        * x, y: 1D-array
+            coordinates mesh in x- and y-directions
+        * data: 1D-array or PreparedGrid
+            input data set (see prepare_grid)
+        * shape: tuple = (nx, ny)
+            data points number in each direction 
+        * rfft: boolean
+            if True, uses the real-to-complex transforms
+        * padding: string, integer or tuple
+            padding mode (see pad_data)
+        * dtype: data type
+            np.float32 computes in single precision (see prepare_grid); None keeps the type of the data
+
+        Returns:
+
+        * result: 1D-array
+            filtered data set
+        """
+
+        grid = prepare_grid(x, y, data, shape, padding, rfft, dtype)
+
+        return np.ravel(self._inverse(grid, self._spectrum(grid), lambda kx, ky: 1))
+
+    def regularized_derivatives(self, x, y, data, shape, orders, alpha, rfft=False, padding='square', dtype=None):
+
+        """
+        Computes regularized derivatives of any order (see regularized_filter_bank) of the data set transformed by the operators.
+
+        Parameters:
+
+        * x, y: 1D-array
+            coordinates mesh in x- and y-directions
+        * data: 1D-array or PreparedGrid
+            input data set (see prepare_grid)
+        * shape: tuple = (nx, ny)
+            data points number in each direction 
+        * orders: list
+            derivative orders, tuples = (nx, ny, nz)
+        * alpha: float or tuple = (alpha_x, alpha_y, alpha_z)
+            regularization parameter, common or one per direction
+        * rfft: boolean
+            if True, uses the real-to-complex transforms
+        * padding: string, integer or tuple
+            padding mode (see pad_data)
+        * dtype: data type
+            np.float32 computes in single precision (see prepare_grid); None keeps the type of the data
+
+        Returns:
+
+        * derivs: list
+            derivatives (1D-arrays), in the order of orders
+        """
+
+        grid = prepare_grid(x, y, data, shape, padding, rfft, dtype)
+        spectrum = self._spectrum(grid)
+
+        derivs = []
+
+        for order in orders:
+            function = lambda kx, ky: regularized_filter_bank(kx, ky, [order], alpha)[0]
+            derivs.append(np.ravel(self._inverse(grid, spectrum, function)))
+
+        return derivs
+
+    def regularized_derivative(self, x, y, data, shape, alpha, rfft=False, padding='square', dtype=None):
+
+        """
+        Computes the regularized first-order derivatives in the x-, y- and z-directions of the data set transformed by the operators 
+        (see regularized_derivative). alpha = 0 gives the non-regularized derivatives.
+
+        Returns:
+
+        * dx, dy, dz: 1D-array
+            derivatives in x-, y- and z-directions
+        """
+
+        return tuple(self.regularized_derivatives(x, y, data, shape, [(1, 0, 0), (0, 1, 0), (0, 0, 1)], alpha, rfft, padding, dtype))
+
+    def s_function_norms(self, x, y, data, shape, alpha, batch_size=8, rfft=False, padding='square', dtype=None):
+
+        """
+        Computes the (non-normalized) Euclidean norm of the regularized directional derivatives of the data set transformed by the 
+        operators, to different regularization parameter values ('fft' method of s_function_norms).
+
+        Parameters:
+
+        * x, y: 1D-array
+            coordinates mesh in x- and y-directions
+        * data: 1D-array or PreparedGrid
+            input data set (see prepare_grid)
+        * shape: tuple = (nx, ny)
+            data points number in each direction 
+        * alpha: 1D-array
+            trial regularization parameters
+        * batch_size: integer
+            number of trial regularization parameters evaluated together
+        * rfft: boolean
+            if True, uses the real-to-complex transforms
+        * padding: string, integer or tuple
+            padding mode (see pad_data)
+        * dtype: data type
+            np.float32 computes in single precision (see prepare_grid); None keeps the type of the data
+
+        Returns:
+
+        * norms: 2D-array = (3, len(alpha))
+            Euclidean norm of the x-, y- and z-derivatives (rows) to the different regularization parameter values (columns)
+        """
+
+        grid = prepare_grid(x, y, data, shape, padding, rfft, dtype)
+        spectrum = self._spectrum(grid)
+        alpha = np.ravel(alpha)
+
+        norms = np.empty((3, alpha.size))
+
+        for start in range(0, alpha.size, batch_size):
+
+            batch = alpha[start:start + batch_size, np.newaxis, np.newaxis]
+
+            for direction in range(3):
+                function = lambda kx, ky: _regularized_filter(kx, ky, batch, direction)
+                deriv = self._inverse(grid, spectrum, function)
+
+                # Sums in double precision, also for single precision derivatives
+                norms[direction, start:start + batch_size] = np.sqrt(np.einsum('ijk,ijk->i', deriv, deriv, dtype=np.float64))
+
+        return norms
+
+    def s_function(self, x, y, data, shape, alpha, batch_size=8, rfft=False, padding='square', dtype=None):
+
+        """
+        Computes the normalized Euclidean norm of the regularized directional derivatives of the data set transformed by the 
+        operators (see s_function_norms).
+
+        Returns:
+
+        * norm_sol_dx, norm_sol_dy, norm_sol_dz: 1D-array
+            normalized Euclidean norm of the x-, y- and z-derivatives to different regularization parameter values
+        """
+
+        norms = self.s_function_norms(x, y, data, shape, alpha, batch_size, rfft, padding, dtype)
+
+        return tuple(norms / np.max(norms, axis=1, keepdims=True))
+
+
+
+def _hermitian_part(gamma):
+
+    """
+    Returns the Hermitian part (gamma(k) + conj(gamma(-k))) / 2 of a filter over the last two axes. For a real data set, the real part 
+    of the inverse transform of spectrum * gamma is the inverse transform of spectrum * hermitian part of gamma.
+    """
+
+    reflected = np.roll(gamma[..., ::-1, ::-1], 1, axis=(-2, -1))
+
+    return (gamma + np.conj(reflected)) / 2
+
+
+
+@profiling.profiled('s_function_batch')
+def _chunk_norms(spectrum, kx, ky, alpha, direction, shape, padshape, padx, pady, rfft):
+
+    """
+    Euclidean norms of the regularized derivatives in one direction for a batch of regularization parameters, computed with one 
+    inverse transform over the last two axes.
+
+    On the full spectrum, direction can be a pair of directions (see _norm_directions): both are computed with the same inverse 
+    transform (see _packed_filter) and the norms are returned as a 2D-array = (2, len(alpha)).
+    """
+
+    nx, ny = shape
+    alpha = alpha[:, np.newaxis, np.newaxis]
+
+    if isinstance(direction, tuple):
+
+        # kx only varies along the rows and ky along the columns
+        kx, ky = kx[..., :1], ky[..., :1, :]
+
+        deriv_fft = spectrum * _packed_filter(*[_regularized_filter(kx, ky, alpha, d) for d in direction])
+        deriv_pad = _inverse_fft(deriv_fft, padshape, packed=True)
+
+        deriv = deriv_pad[:, padx: padx + nx, pady: pady + ny]
+
+        return np.array([np.sqrt(np.einsum('ijk,ijk->i', part, part, dtype=np.float64)) for part in (deriv.real, deriv.imag)])
+
+    deriv_fft = spectrum * _regularized_filter(kx, ky, alpha, direction)
+
+    if rfft and direction == 0:
+        _odd_nyquist(deriv_fft, padshape)
+
+    deriv_pad = _inverse_fft(deriv_fft, padshape, rfft)
+
+    # Removes the padding and sums the squares of each derivative
+    deriv = deriv_pad[:, padx: padx + nx, pady: pady + ny]
+
+    # Sums in double precision, also for single precision derivatives
+    return np.sqrt(np.einsum('ijk,ijk->i', deriv, deriv, dtype=np.float64))
+
+
+
+def _norm_directions(rfft):
+
+    """
+    Directions of the inverse transforms of _chunk_norms: the x- and y-directions are packed in one transform of the full spectrum.
+    """
+
+    return range(3) if rfft else ((0, 1), 2)
+
+
+
+# Spectrum and geometry of the grid in the worker processes of _fft_norms
+_worker_grid = {}
+
+
+
+def _init_worker(shm_name, spectrum_shape, spectrum_dtype, spacing, geometry, backend):
+
+    """
+    Attaches a worker process of _fft_norms to the spectrum in shared memory and rebuilds the wavenumbers.
+    """
+
+    from multiprocessing import shared_memory
+
+    set_fft_backend(*backend)
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    spectrum = np.ndarray(spectrum_shape, dtype=spectrum_dtype, buffer=shm.buf)
+
+    shape, padshape, padx, pady, rfft = geometry
+    kx, ky = _wavenumbers(spacing, padshape, half=rfft)
+
+    # The shared memory block must stay open while the array is used
+    _worker_grid.update(shm=shm, spectrum=spectrum, kx=kx, ky=ky, geometry=geometry)
+
+
+
+def _worker_norms(task):
+
+    """
+    Computes a task = (alpha, direction) of _fft_norms in a worker process.
+    """
+
+    alpha, direction = task
+
+    return _chunk_norms(_worker_grid['spectrum'], _worker_grid['kx'], _worker_grid['ky'], alpha, direction, *_worker_grid['geometry'])
+
+
+
+def _fft_norms(grid, alpha, batch_size, n_jobs=1, parallel='thread'):
+
+    """
+    Euclidean norms of the regularized derivatives with the padding removed, computed with one inverse transform for each batch of 
+    regularization parameters and direction (the x- and y-directions share one transform of the full spectrum). With n_jobs > 1, 
+    the (batch, direction) tasks are spread over a pool of threads or processes; the processes read the spectrum from shared memory 
+    instead of receiving a copy with each task.
+    """
+
+    if parallel not in ('thread', 'process'):
+        raise ValueError("parallel must be 'thread' or 'process', not %r" % (parallel,))
+
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = multiprocessing.cpu_count()
+
+    starts = [(start, direction) for start in range(0, alpha.size, batch_size) for direction in _norm_directions(grid.rfft)]
+    tasks = [(alpha[start:start + batch_size], direction) for start, direction in starts]
+
+    geometry = (grid.shape, grid.padshape, grid.padx, grid.pady, grid.rfft)
+
+    if parallel == 'process' and n_jobs > 1:
+
+        try:
+            from multiprocessing import shared_memory
+        except ImportError:
+            warnings.warn("multiprocessing.shared_memory requires Python 3.8, using threads")
+            parallel = 'thread'
+
+    if n_jobs == 1:
+
+        results = [_chunk_norms(grid.spectrum, grid.kx, grid.ky, a, direction, *geometry) for a, direction in tasks]
+
+    elif parallel == 'thread':
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(n_jobs) as executor:
+            results = list(executor.map(lambda task: _chunk_norms(grid.spectrum, grid.kx, grid.ky, task[0], task[1], *geometry),
+                                        tasks))
+
+    else:
+
+        shm = shared_memory.SharedMemory(create=True, size=grid.spectrum.nbytes)
+
+        try:
+            np.ndarray(grid.spectrum.shape, dtype=grid.spectrum.dtype, buffer=shm.buf)[...] = grid.spectrum
+
+            kwargs = _fft_backend['kwargs']
+            backend = (_fft_backend['name'], kwargs.get('workers', kwargs.get('threads')))
+
+            pool = multiprocessing.Pool(n_jobs, initializer=_init_worker,
+                                        initargs=(shm.name, grid.spectrum.shape, grid.spectrum.dtype.str, grid.spacing,
+                                                  geometry, backend))
+
+            try:
+                results = pool.map(_worker_norms, tasks, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+
+        finally:
+            shm.close()
+            shm.unlink()
+
+    norms = np.empty((3, alpha.size))
+
+    for (start, direction), result in zip(starts, results):
+        norms[direction, start:start + result.shape[-1]] = result
+
+    return norms
+
+
+
+def _spectral_norms(grid, alpha):
+
+    """
+    Euclidean norms of the regularized derivatives over the whole padded grid computed in the Fourier domain (Parseval's theorem), 
+    without any inverse transform.
+
+    The power spectrum is reduced once to the distinct values of kx, ky and kz (the filters only depend on them), so that each 
+    regularization parameter costs a reduction over a 1D-array.
+    """
+
+    kx, ky = grid.kx, grid.ky
+
+    # Power spectrum scaled by the number of points (Parseval)
+    power = np.abs(grid.spectrum) ** 2 / grid.spectrum.size
+
+    # x- and y-filters only depend on the row and the column. The Hermitian part of i*k vanishes at the Nyquist frequency.
+    kx_row = np.imag(_hermitian_part(1j * kx))[:, 0]
+    ky_col = np.imag(_hermitian_part(1j * ky))[0, :]
+    power_x = power.sum(axis=1)
+    power_y = power.sum(axis=0)
+
+    # The z-filter depends on kz, which repeats by symmetry: the power is summed over equal values
+    kz2, inverse = np.unique(kx ** 2 + ky ** 2, return_inverse=True)
+    power_z = np.bincount(np.ravel(inverse), weights=np.ravel(power))
+
+    a = alpha[:, np.newaxis]
+
+    norms = np.empty((3, alpha.size))
+    norms[0] = np.sqrt(np.dot((kx_row / (1 + a * kx_row ** 2)) ** 2, power_x))
+    norms[1] = np.sqrt(np.dot((ky_col / (1 + a * ky_col ** 2)) ** 2, power_y))
+
+    # The z-filters of all parameters are built in blocks to bound the memory (about 2**22 elements)
+    block = max(1, 2 ** 22 // kz2.size)
+
+    for start in range(0, alpha.size, block):
+
+        stop = min(start + block, alpha.size)
+
+        norms[2, start:stop] = np.sqrt(np.dot(kz2 / (1 + a[start:stop] * kz2) ** 2, power_z))
+
+    return norms
+
+
+
+@profiling.profiled('s_function_norms')
+def s_function_norms(x, y, data, shape, alpha, batch_size=8, method='fft', anchors=9, rfft=False, padding='square', n_jobs=1,
+                     parallel='thread', dtype=None):
+
+    """
+    Computes the (non-normalized) Euclidean norm of the regularized directional derivatives to different regularization parameter 
+    values.
+
+    The data are padded and transformed only once. The spectrum and the wavenumbers are reused for all the trial regularization 
+    parameters. Three methods are available:
+
+    - 'fft': the trial regularization parameters are evaluated in batches of 'batch_size' values with a single inverse transform 
+      over the last two axes of a 3D-array, and the norms are computed on the derivatives with the padding removed (equation 6 
+      of the paper). Larger batches are faster but hold batch_size complex copies of the padded grid in memory.
+
+    - 'spectral': the norms are computed directly from the spectrum, sum(|F|^2 * |gamma(alpha)|^2) / N (Parseval's theorem), 
+      without inverse transforms, so that dense sweeps of thousands of parameters cost about one transform. These norms include the 
+      padding strip: as removing the padding only drops squared terms, they are an upper bound of the 'fft' norms, and the 
+      difference grows with the padded fraction of the grid and the amplitude of the edge values.
+
+    - 'corrected': the 'spectral' norms multiplied by the ratio between the 'fft' and the 'spectral' norms, computed exactly at 
+      'anchors' parameters evenly spaced along the S-function (so most of them fall on its sloped portion) and linearly 
+      interpolated in log10(alpha) for the others.
+
+    The 'fft' and 'spectral' norms are kept in an on-disk cache when it is enabled (see set_norm_cache).
+
+    Parameters:
+
+    * x, y: 1D-array
+        coordinates mesh in x- and y-directions
+    * data: 1D-array or PreparedGrid
+        input data set (see prepare_grid)
+    * shape: tuple = (nx, ny)
+        data points number in each direction 
+    * alpha: 1D-array
+        trial regularization parameters
+    * batch_size: integer
+        number of trial regularization parameters evaluated together ('fft' method)
+    * method: string
+        'fft', 'spectral' or 'corrected'
+    * anchors: integer
+        number of parameters evaluated exactly ('corrected' method)
+    * rfft: boolean
+        if True, the inverse transforms of the 'fft' and 'corrected' methods use the real-to-complex transforms (np.fft.rfft2 and 
+        np.fft.irfft2), which compute only half of the spectrum
+    * padding: string, integer or tuple
+        padding mode (see pad_data)
+    * n_jobs: integer
+        number of threads or processes evaluating the batches and directions of the 'fft' and 'corrected' methods (-1 uses
+        all the processors)
+    * parallel: string
+        'thread' or 'process'; the processes share the spectrum through shared memory (Python 3.8 or later)
+    * dtype: data type
+        np.float32 computes in single precision (see prepare_grid); None keeps the type of the data
+
+    Returns:
+
+    * norms: 2D-array = (3, len(alpha))
+        Euclidean norm of the x-, y- and z-derivatives (rows) to the different regularization parameter values (columns)
+    """
+
+    if method not in ('fft', 'spectral', 'corrected'):
+        raise ValueError("method must be 'fft', 'spectral' or 'corrected', not %r" % (method,))
+
+    alpha = np.ravel(alpha)
+
+    if _norm_cache['directory'] is not None and method != 'corrected':
+        return _cached_norms(x, y, data, shape, alpha, batch_size, method, rfft, padding, n_jobs, parallel, dtype)
+
+    if method == 'fft':
+        return _fft_norms(prepare_grid(x, y, data, shape, padding, rfft, dtype), alpha, batch_size, n_jobs, parallel)
+
+    # The Parseval sums need the full spectrum
+    grid = prepare_grid(x, y, data, shape, padding, False, dtype)
+
+    norms = _spectral_norms(grid, alpha)
+
+    if method == 'corrected':
+
+        # The anchors are evenly spaced along the mean normalized S-function, so they concentrate on its sloped portion
+        log_alpha = np.log10(alpha)
+        order = np.argsort(log_alpha)
+        mean_norm = np.mean(norms / norms.max(axis=1, keepdims=True), axis=0)[order]
+        levels = np.linspace(mean_norm.min(), mean_norm.max(), max(anchors, 2))
+        log_anchor = np.unique(np.interp(levels, np.maximum.accumulate(mean_norm[::-1]), log_alpha[order][::-1]))
+        anchor = 10 ** log_anchor
+
+        exact = _fft_norms(prepare_grid(x, y, grid, shape, padding, rfft), anchor, batch_size, n_jobs, parallel)
+
+        ratio = exact / _spectral_norms(grid, anchor)
+
+        for i in range(3):
+            norms[i] = norms[i] * np.interp(log_alpha, log_anchor, ratio[i])
+
+    return norms
+
+
+
+def s_function(x, y, data, shape, alpha, batch_size=8, method='fft', anchors=9, rfft=False, padding='square', n_jobs=1,
+               parallel='thread', dtype=None):
+
+    """
+    Computes the normalized Euclidean norm of the directional derivatives to different regularization parameter values using equations 
+    6 and 7 of the paper.
+
+    Parameters:
+
+    * x, y: 1D-array
+        coordinates mesh in x- and y-directions
+    * data: 1D-array or PreparedGrid
+        input data set (see prepare_grid)
+    * shape: tuple = (nx, ny)
+        data points number in each direction 
+    * alpha: 1D-array
+        trial regularization parameters
+    * batch_size: integer
+        number of trial regularization parameters evaluated together (see s_function_norms)
+    * method: string
+        'fft', 'spectral' or 'corrected' (see s_function_norms)
+    * anchors: integer
+        number of parameters evaluated exactly by the 'corrected' method
+    * rfft: boolean
+        if True, uses the real-to-complex transforms (see s_function_norms)
+    * padding: string, integer or tuple
+        padding mode (see pad_data)
+    * n_jobs: integer
+        number of threads or processes (see s_function_norms)
+    * parallel: string
+        'thread' or 'process' (see s_function_norms)
+    * dtype: data type
+        np.float32 computes in single precision (see prepare_grid); None keeps the type of the data
+
+    Returns:
+
+    * norm_sol_dx, norm_sol_dy, norm_sol_dz: 1D-array
+        normalized Euclidean norm of the x-, y- and z-derivatives to different regularization parameter values
+    """
+
+    norms = s_function_norms(x, y, data, shape, alpha, batch_size, method, anchors, rfft, padding, n_jobs, parallel, dtype)
+
+    norm_sol_dx = norms[0]/max(norms[0])
+    norm_sol_dy = norms[1]/max(norms[1])
+    norm_sol_dz = norms[2]/max(norms[2])
+
+    return norm_sol_dx, norm_sol_dy, norm_sol_dz
+
+
+
+@profiling.profiled('stack_s_function_norms')
+def stack_s_function_norms(stack, spacing, alpha, rfft=False, padding='square'):
+
+    """
+    Computes the (non-normalized) Euclidean norms of the regularized directional derivatives of n data sets with the same shape and 
+    grid spacing. The data sets are padded and transformed together (one transform over the last two axes of a 3D-array) and each 
+    trial regularization parameter costs one inverse transform of the stack per direction.
+
+    Parameters:
+
+    * stack: 3D-array = (n, nx, ny)
+        input data sets
+    * spacing: tuple = (dx, dy)
+        grid spacing in x- and y-directions
+    * alpha: 1D-array
+        trial regularization parameters
+    * rfft: boolean
+        if True, uses the real-to-complex transforms
+    * padding: string, integer or tuple
+        padding mode (see pad_data)
+
+    Returns:
+
+    * norms: 3D-array = (n, 3, len(alpha))
+        Euclidean norm of the x-, y- and z-derivatives of each data set to the different regularization parameter values
+    """
+
+    alpha = np.ravel(alpha)
+    stack = np.asarray(stack)
+
+    grid = PreparedGrid(stack, stack.shape[-2:], spacing, padding, rfft)
+    geometry = (grid.shape, grid.padshape, grid.padx, grid.pady, grid.rfft)
+
+    norms = np.empty((stack.shape[0], 3, alpha.size))
+
+    for j in range(alpha.size):
+        for direction in _norm_directions(grid.rfft):
+
+            # The filter of a single parameter broadcasts over the stack, giving one norm per data set
+            norms[:, direction, j] = np.transpose(_chunk_norms(grid.spectrum, grid.kx, grid.ky, alpha[j:j + 1], direction, *geometry))
+
+    return norms
+
+
+
+@profiling.profiled('stack_derivative')
+def stack_derivative(stack, spacing, alpha=None, rfft=False, padding='square'):
+
+    """
+    Computes the regularized (or non-regularized) first-order derivatives of n data sets with the same shape and grid spacing, 
+    padded and transformed together.
+
+    Parameters:
+
+    * stack: 3D-array = (n, nx, ny)
+        input data sets
+    * spacing: tuple = (dx, dy)
+        grid spacing in x- and y-directions
+    * alpha: float, 1D-array or 2D-array = (n, 3)
+        regularization parameter, common, one per data set, or one per data set and direction; None computes the non-regularized 
+        derivatives
+    * rfft: boolean
+        if True, uses the real-to-complex transforms
+    * padding: string, integer or tuple
+        padding mode (see pad_data)
+
+    Returns:
+
+    * dx, dy, dz: 3D-array = (n, nx, ny)
+        derivatives in x-, y- and z-directions
+    """
+
+    stack = np.asarray(stack)
+
+    grid = PreparedGrid(stack, stack.shape[-2:], spacing, padding, rfft)
+
+    if alpha is None:
+        return _grid_nonregularized_derivative(grid, 1)
+
+    if np.ndim(alpha) == 2:
+        alpha = tuple(np.reshape(alpha[:, direction], (-1, 1, 1)) for direction in range(3))
+    else:
+        alpha = np.reshape(alpha, (-1, 1, 1))
+
+    return _grid_regularized_derivative(grid, alpha)
+
+
+
+@profiling.profiled('regularization_parameter')
+def regularization_parameter(norm_sol, alpha_test, upper_limit, inferior_limit, value_norm):
+
+    """
+    Determines the regularization parameter associated with a Euclidean norm-specific value located in the S-function sloped portion. 
+    As the S-function is evaluated for regularization parameter discrete values, it is fitted a linear approximation in the S-function 
+    sloped portion considering a specific interval [inferior limit, upper limit].
+
+    The least-squares line is computed in closed form for all the S-functions given at once (e.g. the x-, y- and z-derivatives of 
+    many grids). An S-function with less than two points in the interval has no fitted line and its parameter is NaN.
+
+    Parameters:
+
+    * norm_sol: 1D-array or ND-array = (..., nalpha)
+        Euclidean norm of the regularized derivatives, one S-function along the last axis
+    * alpha_test: 1D-array
+        Trial regularization parameters
+    * upper_limit: float
+        Upper limit of the S-function's linear variation interval 
+    * inferior_limit: float
+        Inferior limit of the S-function's linear variation interval 
+    * value_norm: float
+        Euclidean norm-specific value
+    Returns:
+
+    * alpha_value: 1D-array = (1,) or ND-array = norm_sol.shape[:-1]
+        regularization parameter associate with Euclidean norm-specific value (exponent of base 10)
+    """
+
+    norm_sol = np.asarray(norm_sol, dtype=np.float64)
+    alpha_test = np.asarray(alpha_test, dtype=np.float64)
+
+    # Defines the linear variation interval of the S-function
+    rounded = np.round(norm_sol, 1)
+    mask = (inferior_limit <= rounded) & (rounded <= upper_limit)
+
+    count = np.sum(mask, axis=-1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+
+        # Least-squares line norm = a*alpha + b fitted to the centered points of the interval
+        alpha_mean = np.sum(mask * alpha_test, axis=-1) / count
+        norm_mean = np.sum(np.where(mask, norm_sol, 0), axis=-1) / count
+
+        alpha_dev = np.where(mask, alpha_test - alpha_mean[..., np.newaxis], 0)
+        norm_dev = np.where(mask, norm_sol - norm_mean[..., np.newaxis], 0)
+
+        a = np.sum(alpha_dev * norm_dev, axis=-1) / np.sum(alpha_dev ** 2, axis=-1)
+        b = norm_mean - a * alpha_mean
+
+        # Calculates the regularization parameter associated with a particular Euclidean norm value
+        alpha_value = np.log10((value_norm - b) / a)
+
+    alpha_value = np.where(count < 2, np.nan, alpha_value)
+
+    if norm_sol.ndim == 1:
+        return alpha_value.reshape(1)
+
+    return alpha_value
+
+
+
+def _fit_logistic(t, norm, iterations=200):
+
+    """
+    Fits the logistic curve norm = lower + (upper - lower)/(1 + exp(slope*(t - center))) to an S-function by the Levenberg-Marquardt 
+    method. Returns the parameters (lower, upper, center, slope) and the fitted curve.
+    """
+
+    lower, upper = np.min(norm), np.max(norm)
+
+    # Initial center where the S-function crosses half of its range and slope from its steepest descent
+    half = 0.5 * (lower + upper)
+    crossing = np.nonzero(norm <= half)[0]
+
+    if crossing.size == 0 or crossing[0] == 0:
+        center = t[len(t) // 2]
+    else:
+        i = crossing[0]
+        center = t[i - 1] + (t[i] - t[i - 1]) * (norm[i - 1] - half) / (norm[i - 1] - norm[i])
+
+    slope = -4 * np.min(np.gradient(norm, t)) / max(upper - lower, 1e-12)
+
+    params = np.array([lower, upper, center, slope if slope > 0 else 1.0])
+
+    def model(p):
+        g = 0.5 * (1 - np.tanh(0.5 * p[3] * (t - p[2])))
+        return p[0] + (p[1] - p[0]) * g, g
+
+    curve, g = model(params)
+    cost = np.sum((curve - norm) ** 2)
+    damping = 1e-3
+
+    for _ in range(iterations):
+
+        dg = g * (1 - g)
+        jacobian = np.column_stack((1 - g, g, (params[1] - params[0]) * params[3] * dg,
+                                    -(params[1] - params[0]) * (t - params[2]) * dg))
+
+        hessian = np.dot(jacobian.T, jacobian)
+        gradient = np.dot(jacobian.T, curve - norm)
+
+        step = np.linalg.solve(hessian + damping * np.diag(np.diag(hessian) + 1e-12), -gradient)
+
+        trial_curve, trial_g = model(params + step)
+        trial_cost = np.sum((trial_curve - norm) ** 2)
+
+        if trial_cost < cost:
+            converged = cost - trial_cost <= 1e-14 * max(cost, 1e-30)
+            params, curve, g, cost = params + step, trial_curve, trial_g, trial_cost
+            damping = max(damping / 10, 1e-12)
+            if converged:
+                break
+        else:
+            damping *= 10
+            if damping > 1e12:
+                break
+
+    return params, curve
+
+
+
+@profiling.profiled('auto_regularization_parameter')
+def auto_regularization_parameter(norm_sol, alpha_test, value_norm=0.5):
+
+    """
+    Determines the regularization parameter associated with a Euclidean norm-specific value without the manual limits of the 
+    S-function's linear variation interval. A logistic curve is fitted to the S-function in log10 of the regularization parameter: its 
+    inflection point locates the sloped portion, whose limits are the extrema of the curvature, and the parameter is read at the 
+    Euclidean norm-specific value of the fitted curve.
+
+    The confidence is the coefficient of determination (R²) of the fit in the sloped portion: close to 1 for a well defined step, 
+    lower for S-functions with shoulders or noise, which should then be checked on the S-function plot. It is NaN if the sloped 
+    portion has less than three trial parameters, and 0 if the sweep does not cover the step: the sloped portion reaches the first 
+    or last trial parameter, or a fitted plateau lies outside the range of the norms (e.g. a straight line, which never reaches 
+    either plateau). Constant S-functions (or with non-finite norms) and failed fits give a NaN parameter with confidence 0 and a 
+    warning.
+
+    Parameters:
+
+    * norm_sol: 1D-array or ND-array = (..., nalpha)
+        Euclidean norm of the regularized derivatives, one S-function along the last axis
+    * alpha_test: 1D-array
+        Trial regularization parameters
+    * value_norm: float
+        Euclidean norm-specific value
+
+    Returns:
+
+    * alpha_value: 1D-array = (1,) or ND-array = norm_sol.shape[:-1]
+        regularization parameter associate with Euclidean norm-specific value (exponent of base 10)
+    * confidence: 1D-array = (1,) or ND-array = norm_sol.shape[:-1]
+        coefficient of determination of the fit in the S-function sloped portion
+    * limits: ND-array = (..., 2)
+        detected inferior and upper limits of the S-function's linear variation interval
+    """
+
+    norm_sol = np.asarray(norm_sol, dtype=np.float64)
+    t = np.log10(np.asarray(alpha_test, dtype=np.float64))
+
+    curves = norm_sol.reshape(-1, norm_sol.shape[-1])
+    alpha_value = np.full(len(curves), np.nan)
+    confidence = np.full(len(curves), np.nan)
+    limits = np.full((len(curves), 2), np.nan)
+
+    # Distance to the inflection point of the extrema of the logistic curvature: slope*(t - center) = ln(2 + sqrt(3))
+    knee = np.log(2 + np.sqrt(3))
+
+    degenerate = 0
+
+    for i, norm in enumerate(curves):
+
+        if not np.all(np.isfinite(norm)) or np.ptp(norm) == 0:
+            confidence[i] = 0.0
+            degenerate += 1
+            continue
+
+        with np.errstate(all='ignore'):
+            (lower, upper, center, slope), curve = _fit_logistic(t, norm)
+
+        if not np.all(np.isfinite([lower, upper, center, slope])) or upper == lower or slope == 0:
+            confidence[i] = 0.0
+            degenerate += 1
+            continue
+
+        level = (value_norm - lower) / (upper - lower)
+
+        if 0 < level < 1 and slope > 0:
+            alpha_value[i] = center + np.log(1 / level - 1) / slope
+
+        limits[i] = lower + (upper - lower) * 0.5 * (1 + np.array([-1, 1]) * np.tanh(0.5 * knee))
+
+        sloped = np.abs(t - center) <= knee / abs(slope)
+
+        if np.sum(sloped) >= 3:
+            residual = np.sum((norm[sloped] - curve[sloped]) ** 2)
+            total = np.sum((norm[sloped] - np.mean(norm[sloped])) ** 2)
+            confidence[i] = 1 - residual / total
+
+        # Plateaus extrapolated beyond the observed norms (5% of their range) or a step cut by the ends of the sweep
+        margin = 0.05 * (np.max(norm) - np.min(norm))
+        outside = min(lower, upper) < np.min(norm) - margin or max(lower, upper) > np.max(norm) + margin
+
+        if outside or sloped[0] or sloped[-1]:
+            confidence[i] = 0.0
+
+    if degenerate:
+        warnings.warn("%d S-function(s) are constant or could not be fitted, their regularization parameter is NaN" % degenerate)
+
+    shape = norm_sol.shape[:-1] if norm_sol.ndim > 1 else (1,)
+
+    return alpha_value.reshape(shape), confidence.reshape(shape), limits.reshape(norm_sol.shape[:-1] + (2,))
+
+
+
+@profiling.profiled('adaptive_regularization_parameter')
+def adaptive_regularization_parameter(x, y, data, shape, alpha_test, upper_limit, inferior_limit, value_norm, rfft=False,
+                                      padding='square', dtype=None):
+
+    """
+    Determines the regularization parameters of the x-, y- and z-derivatives as regularization_parameter does on the S-function, 
+    evaluating the Euclidean norm only at the trial regularization parameters that the choice depends on.
+
+    The S-function decreases with the regularization parameter, so its linear variation interval [inferior limit, upper limit] is a 
+    contiguous range of the trial parameters. Its two ends are found by bisection over the trial parameters and only the points in 
+    between are evaluated; the S-function is normalized by its value at the smallest trial parameter (its maximum). With the 41 trial 
+    parameters of the scripts, 7 to 10 norms are computed per direction on the synthetic data instead of 41, for the same result.
+
+    Parameters:
+
+    * x, y: 1D-array
+        coordinates mesh in x- and y-directions
+    * data: 1D-array or PreparedGrid
+        input data set (see prepare_grid)
+    * shape: tuple = (nx, ny)
+        data points number in each direction 
+    * alpha_test: 1D-array
+        trial regularization parameters
+    * upper_limit: float
+        upper limit of the S-function's linear variation interval 
+    * inferior_limit: float
+        inferior limit of the S-function's linear variation interval 
+    * value_norm: float
+        Euclidean norm-specific value
+    * rfft: boolean
+        if True, uses the real-to-complex transforms
+    * padding: string, integer or tuple
+        padding mode (see pad_data)
+    * dtype: data type
+        np.float32 computes in single precision (see prepare_grid); None keeps the type of the data
+
+    Returns:
+
+    * alpha_value: 1D-array = (3,)
+        regularization parameters of the x-, y- and z-derivatives (exponents of base 10)
+    * norm_sol: 2D-array = (3, len(alpha_test))
+        normalized Euclidean norms of the x-, y- and z-derivatives; NaN at the trial parameters that were not evaluated
+    """
+
+    grid = prepare_grid(x, y, data, shape, padding, rfft, dtype)
+    geometry = (grid.shape, grid.padshape, grid.padx, grid.pady, grid.rfft)
+
+    alpha_test = np.ravel(alpha_test)
+    order = np.argsort(alpha_test)
+    alpha = alpha_test[order]
+
+    norm_sol = np.full((3, alpha.size), np.nan)
+
+    for direction in range(3):
+
+        norms = norm_sol[direction]
+
+        def rounded(i):
+            # Normalized norm at the i-th trial parameter, rounded as in regularization_parameter (memoized)
+            if np.isnan(norms[i]):
+                norms[i] = _chunk_norms(grid.spectrum, grid.kx, grid.ky, alpha[i:i + 1], direction, *geometry)[0]
+            return np.round(norms[i] / norms[0], 1)
+
+        def first(below, start):
+            # First trial parameter from start where the rounded S-function is below the limit (bisection)
+            lo, hi = start, alpha.size
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if below(rounded(mid)):
+                    hi = mid
+                else:
+                    lo = mid + 1
+            return lo
+
+        rounded(0)
+
+        start = first(lambda value: value <= upper_limit, 0)
+        stop = first(lambda value: value < inferior_limit, start)
+
+        for i in range(start, stop):
+            rounded(i)
+
+        norms /= norms[0]
+
+    alpha_value = regularization_parameter(norm_sol, alpha, upper_limit, inferior_limit, value_norm)
+
+    # Back to the order of alpha_test
+    norm_sol[:, order] = norm_sol.copy()
+
+    return alpha_value, norm_sol
+
+
+
+@profiling.profiled('asa_tdr')
+def asa_tdr(dx, dy, dz, dtype=None, out=None):
+
+    """
+    Computes the analytical signal amplitude and tilt derivative using equations 1 and 2 of the paper, respectively.
+
+    Both results are computed in one pass over the derivatives, without full-size temporary arrays: in blocks of rows small enough 
+    to stay in the processor cache, or by numexpr if it is installed and runs several threads.
+
+    Parameters:
+
+    * dx: 1D-array
+        x-derivative
+    * dy: 1D-array
+        y-derivative
+    * dz: 1D-array
+        z-derivative
+    * dtype: data type
+        type of the results (e.g. np.float32); None keeps the type of the derivatives
+    * out: tuple = (asa, tdr)
+        arrays with the shape of the derivatives that receive the results (e.g. reused across calls or memory-mapped); new arrays 
+        if None
+
+    Returns:
+
+    * asa: 1D-array
+        analytical signal amplitude
+    * tdr: 1D-array
+        tilt derivative
+    """
+
+    if dtype is None:
+        dtype = np.result_type(*[np.asarray(deriv).dtype for deriv in (dx, dy, dz)] + [np.float32])
+
+    dx, dy, dz = [np.asarray(deriv, dtype=dtype) for deriv in (dx, dy, dz)]
+
+    if out is None:
+        out = (np.empty(dx.shape, dtype=dtype), np.empty(dx.shape, dtype=dtype))
+
+    asa, tdr = out
+
+    try:
+        import numexpr
+    except ImportError:
+        numexpr = None
+
+    if numexpr is not None and numexpr.get_num_threads() > 1:
+
+        numexpr.evaluate('arctan2(dz, sqrt(dx * dx + dy * dy))', out=tdr, casting='same_kind')
+        numexpr.evaluate('sqrt(dx * dx + dy * dy + dz * dz)', out=asa, casting='same_kind')
+
+        return asa, tdr
+
+    if dx.ndim == 0:
+        dx, dy, dz, asa, tdr = [np.reshape(array, 1) for array in (dx, dy, dz, asa, tdr)]
+
+    # Blocks of about 2**14 points along the first axis
+    rows = max(1, 2 ** 14 // max(1, dx[0].size))
+    scratch = np.empty((rows,) + dx.shape[1:], dtype=dtype)
+
+    for i in range(0, dx.shape[0], rows):
+
+        block = slice(i, i + rows)
+        bx, by, bz, basa, btdr = dx[block], dy[block], dz[block], asa[block], tdr[block]
+        square = scratch[:len(bx)]
+
+        # Horizontal gradient (in the tdr block) and squared amplitude (in the asa block)
+        np.multiply(bx, bx, out=basa)
+        np.multiply(by, by, out=btdr)
+        basa += btdr
+        np.sqrt(basa, out=btdr)
+
+        np.multiply(bz, bz, out=square)
+        basa += square
+
+        np.sqrt(basa, out=basa)
+        np.arctan2(bz, btdr, out=btdr)
+
+    return out
+
+
+
+def _tiles(shape, tile, overlap):
+
+    """
+    Splits a grid into windows of at most tile x tile points overlapping by 'overlap' points. Yields the window slices in the grid, 
+    the slices of the window core in the window and the slices of the window core in the grid. The cores cover the grid without 
+    overlapping.
+    """
+
+    step = tile - 2 * overlap
+
+    if step < 1:
+        raise ValueError("tile must be larger than 2 * overlap")
+
+    nx, ny = shape
+
+    for i0 in range(0, nx, step):
+        for j0 in range(0, ny, step):
+
+            i1, j1 = min(i0 + step, nx), min(j0 + step, ny)
+            wi0, wj0 = max(i0 - overlap, 0), max(j0 - overlap, 0)
+            wi1, wj1 = min(i1 + overlap, nx), min(j1 + overlap, ny)
+
+            yield ((slice(wi0, wi1), slice(wj0, wj1)), (slice(i0 - wi0, i1 - wi0), slice(j0 - wj0, j1 - wj0)),
+                   (slice(i0, i1), slice(j0, j1)))
+
+
+
+@profiling.profiled('tiled_derivative')
+def tiled_derivative(data, spacing, alpha=None, out=None, tile=1024, overlap=128, padding=None, rfft=True, dtype=np.float64):
+
+    """
+    Computes the regularized (or non-regularized) first-order derivatives of a grid in overlapping windows, so that grids larger 
+    than the memory can be processed from and to memory-mapped arrays (np.load(..., mmap_mode='r'), np.lib.format.open_memmap). 
+    Only one window (tile x tile points) is padded and transformed at a time.
+
+    Each window is extended by 'overlap' points on each side, padded (by default with 'overlap' edge values on each side), filtered, 
+    and only its core is written. The results are an approximation of the derivatives of the whole grid: the x- and y-derivatives 
+    differ by a few percent of their maximum away from the grid edges when the overlap is larger than the width of the filter 
+    response (a few times sqrt(alpha) for the regularized derivatives), and the differences decrease with the overlap. The filter 
+    of the z-derivative (kz) is not local, so the z-derivative differs more, also inside the grid (about 10% of its maximum on 
+    a 2500 x 2500 grid with the default tile and overlap). The windows are padded independently, so the grid edges are not 
+    processed as in the whole grid either.
+
+    Parameters:
+
+    * data: 2D-array = (nx, ny)
+        input data set (e.g. a memory-mapped array)
+    * spacing: tuple = (dx, dy)
+        grid spacing in x- and y-directions
+    * alpha: float
+        regularization parameter; None computes the non-regularized derivatives
+    * out: tuple = (dx, dy, dz)
+        2D-arrays (e.g. memory-mapped) that receive the derivatives; new arrays are created if None
+    * tile: integer
+        window size in points
+    * overlap: integer
+        number of points added on each side of the window core
+    * padding: string, integer or tuple
+        padding mode of each window (see pad_data); None pads 'overlap' points on each side
+    * rfft: boolean
+        if True, uses the real-to-complex transforms
+    * dtype: data type
+        precision of the computation and of the new output arrays (np.float64 or np.float32)
+
+    Returns:
+
+    * dx, dy, dz: 2D-array
+        derivatives in x-, y- and z-directions
+    """
+
+    shape = np.shape(data)
+    padding = overlap if padding is None else padding
+
+    if out is None:
+        out = tuple(np.empty(shape, dtype=dtype) for i in range(3))
+
+    # Filtered spectra of the windows, reused from one window to the next
+    work = {}
+
+    for window, core, target in _tiles(shape, tile, overlap):
+
+        block = np.asarray(data[window], dtype=dtype)
+        grid = PreparedGrid(block, block.shape, spacing, padding, rfft)
+
+        if alpha is None:
+            derivs = _grid_nonregularized_derivative(grid, 1, work=work)
+        else:
+            derivs = _grid_regularized_derivative(grid, alpha, work=work)
+
+        for deriv, result in zip(derivs, out):
+            result[target] = deriv[core]
+
+    return out
+
+
+
+@profiling.profiled('tiled_asa_tdr')
+def tiled_asa_tdr(data, spacing, alpha=None, out=None, tile=1024, overlap=128, padding=None, rfft=True, dtype=np.float64):
+
+    """
+    Computes the analytical signal amplitude and tilt derivative of a grid in overlapping windows (see tiled_derivative), without 
+    storing the derivatives.
+
+    Parameters:
+
+    * data: 2D-array = (nx, ny)
+        input data set (e.g. a memory-mapped array)
+    * spacing: tuple = (dx, dy)
+        grid spacing in x- and y-directions
+    * alpha: float
+        regularization parameter; None uses the non-regularized derivatives
+    * out: tuple = (asa, tdr)
+        2D-arrays (e.g. memory-mapped) that receive the results; new arrays are created if None
+    * tile: integer
+        window size in points
+    * overlap: integer
+        number of points added on each side of the window core
+    * padding: string, integer or tuple
+        padding mode of each window (see pad_data); None pads 'overlap' points on each side
+    * rfft: boolean
+        if True, uses the real-to-complex transforms
+    * dtype: data type
+        precision of the computation and of the new output arrays (np.float64 or np.float32)
+
+    Returns:
+
+    * asa: 2D-array
+        analytical signal amplitude
+    * tdr: 2D-array
+        tilt derivative
+    """
+
+    shape = np.shape(data)
+    padding = overlap if padding is None else padding
+
+    if out is None:
+        out = (np.empty(shape, dtype=dtype), np.empty(shape, dtype=dtype))
+
+    # Filtered spectra of the windows, reused from one window to the next
+    work = {}
+
+    for window, core, target in _tiles(shape, tile, overlap):
+
+        block = np.asarray(data[window], dtype=dtype)
+        grid = PreparedGrid(block, block.shape, spacing, padding, rfft)
+
+        if alpha is None:
+            dx, dy, dz = _grid_nonregularized_derivative(grid, 1, work=work)
+        else:
+            dx, dy, dz = _grid_regularized_derivative(grid, alpha, work=work)
+
+        # The results are written directly in the output arrays
+        asa_tdr(dx[core], dy[core], dz[core], out=(out[0][target], out[1][target]))
+
+    return out
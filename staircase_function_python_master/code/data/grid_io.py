@@ -0,0 +1,421 @@
+"""
+Grid input and output
+
+A Python program to store gridded data sets in a compact binary format and to read and write them as memory-mapped arrays, avoiding
+the parsing of XYZ text files (np.loadtxt, np.savetxt) on large surveys.
+
+A grid is stored in two files: the values in a NumPy '.npy' file, with shape (nx, ny) and the x-direction along the first axis, and
+a JSON header with the same name and the extension '.json' holding the shape, the grid spacing (dx, dy) and the origin (xmin, ymin).
+
+This code is released from the paper: Python programs to apply regularized derivatives in the magnetic tilt derivative and gradient intensity data
+processing: a graphical procedure to choose the regularization parameter.
+
+The program is under the conditions terms in the file README.txt.
+
+authors:Janaína A. Melo (IAG-USP), Carlos A. Mendonça (IAG-USP) and Yara R. Marangoni (IAG-USP) (2023)
+email: janaina.melo@usp.br (J.A. Melo); carlos.mendonca@iag.usp.br (C.A. Mendonça); yaramaran@usp.br. (Y.R. Marangoni)
+"""
+
+import json
+import os
+import warnings
+
+import numpy as np
+
+import profiling
+
+
+
+def header_file(filename):
+
+    """
+    Returns the name of the JSON header of a grid file ('grid.npy' -> 'grid.json').
+    """
+
+    return os.path.splitext(filename)[0] + '.json'
+
+
+
+def write_header(filename, shape, spacing, origin):
+
+    """
+    Writes the JSON header of a grid file.
+
+    Parameters:
+
+    * filename: string
+        grid file name (.npy)
+    * shape: tuple = (nx, ny)
+        data points number in each direction
+    * spacing: tuple = (dx, dy)
+        grid spacing in x- and y-directions
+    * origin: tuple = (xmin, ymin)
+        coordinates of the first grid point
+    """
+
+    header = {'shape': [int(n) for n in shape], 'spacing': [float(d) for d in spacing], 'origin': [float(o) for o in origin]}
+
+    with open(header_file(filename), 'w') as f:
+        json.dump(header, f)
+
+
+
+def read_header(filename):
+
+    """
+    Reads the JSON header of a grid file.
+
+    Parameters:
+
+    * filename: string
+        grid file name (.npy)
+
+    Returns:
+
+    * header: dictionary
+        'shape' = (nx, ny), 'spacing' = (dx, dy) and 'origin' = (xmin, ymin)
+    """
+
+    with open(header_file(filename)) as f:
+        header = json.load(f)
+
+    return dict((key, tuple(value)) for key, value in header.items())
+
+
+
+@profiling.profiled('save_grid')
+def save_grid(filename, values, spacing, origin):
+
+    """
+    Saves a grid in the binary format.
+
+    Parameters:
+
+    * filename: string
+        grid file name (.npy)
+    * values: 2D-array = (nx, ny)
+        gridded data set
+    * spacing: tuple = (dx, dy)
+        grid spacing in x- and y-directions
+    * origin: tuple = (xmin, ymin)
+        coordinates of the first grid point
+    """
+
+    np.save(filename, np.asarray(values))
+    write_header(filename, np.shape(values), spacing, origin)
+
+
+
+@profiling.profiled('load_grid')
+def load_grid(filename, mmap_mode='r'):
+
+    """
+    Loads a grid saved in the binary format. By default the values are memory-mapped: they are read from the disk only when used,
+    so opening a grid is immediate whatever its size.
+
+    Parameters:
+
+    * filename: string
+        grid file name (.npy)
+    * mmap_mode: string
+        memory-map mode of np.load ('r', 'r+', 'c'); None reads the whole grid in memory
+
+    Returns:
+
+    * values: 2D-array = (nx, ny)
+        gridded data set
+    * header: dictionary
+        'shape' = (nx, ny), 'spacing' = (dx, dy) and 'origin' = (xmin, ymin)
+    """
+
+    values = np.load(filename, mmap_mode=mmap_mode)
+    header = read_header(filename)
+
+    if tuple(values.shape) != header['shape']:
+        raise ValueError("grid %s has shape %s but its header says %s" % (filename, values.shape, header['shape']))
+
+    return values, header
+
+
+
+def create_grid(filename, shape, spacing, origin, dtype=np.float64):
+
+    """
+    Creates a grid file in the binary format and returns it as a writable memory-mapped array, e.g. to receive the results of
+    filtering.tiled_derivative and filtering.tiled_asa_tdr.
+
+    Parameters:
+
+    * filename: string
+        grid file name (.npy)
+    * shape: tuple = (nx, ny)
+        data points number in each direction
+    * spacing: tuple = (dx, dy)
+        grid spacing in x- and y-directions
+    * origin: tuple = (xmin, ymin)
+        coordinates of the first grid point
+    * dtype: data type
+        type of the values
+
+    Returns:
+
+    * values: 2D-array = (nx, ny)
+        memory-mapped grid
+    """
+
+    values = np.lib.format.open_memmap(filename, mode='w+', dtype=dtype, shape=tuple(shape))
+    write_header(filename, shape, spacing, origin)
+
+    return values
+
+
+
+def grid_coordinates(header):
+
+    """
+    Computes the coordinates of the grid points in the order of the values (x-direction along the first axis).
+
+    Parameters:
+
+    * header: dictionary
+        grid header (see read_header)
+
+    Returns:
+
+    * x, y: 1D-array
+        coordinates mesh in x- and y-directions
+    """
+
+    nx, ny = header['shape']
+    dx, dy = header['spacing']
+    xmin, ymin = header['origin']
+
+    x, y = np.meshgrid(xmin + dx * np.arange(nx), ymin + dy * np.arange(ny), indexing='ij')
+
+    return np.ravel(x), np.ravel(y)
+
+
+
+def _xyz_chunks(xyz_file, chunk_rows):
+
+    """
+    Yields the rows of an XYZ text file in 2D-arrays of at most chunk_rows rows, parsed by the C reader of pandas if it is installed 
+    or by np.loadtxt otherwise.
+    """
+
+    try:
+        import pandas
+    except ImportError:
+        pandas = None
+
+    if pandas is not None:
+
+        for chunk in pandas.read_csv(xyz_file, sep=r'\s+', header=None, comment='#', chunksize=chunk_rows, engine='c'):
+            yield chunk.to_numpy(dtype=np.float64)
+
+        return
+
+    with open(xyz_file) as f:
+
+        while True:
+
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                chunk = np.loadtxt(f, max_rows=chunk_rows, ndmin=2)
+
+            if chunk.size == 0:
+                return
+
+            yield chunk
+
+            if len(chunk) < chunk_rows:
+                return
+
+
+
+@profiling.profiled('read_xyz')
+def read_xyz(xyz_file, column=-1, shape=None, chunk_rows=2 ** 20, filename=None):
+
+    """
+    Reads an XYZ text file of a regular grid (one point per row: x, y, ..., value) in chunks and places the values directly in a 
+    2D-array, without holding all the columns of the file in memory.
+
+    The rows must follow the grid lines, with either x or y varying fastest, in increasing or decreasing order. The grid origin, 
+    spacing and ordering are detected from the first rows; every row is then checked against the grid while reading, so irregular 
+    nodes raise a ValueError, and missing or repeated nodes are reported by a warning at the end (missing values are NaN). When the 
+    shape is not given, the array grows as the rows are read.
+
+    Parameters:
+
+    * xyz_file: string
+        XYZ text file name (e.g. 'input/synthetic_data.dat')
+    * column: integer
+        column of the values
+    * shape: tuple = (nx, ny)
+        data points number in each direction, if known
+    * chunk_rows: integer
+        number of rows parsed at a time
+    * filename: string
+        grid file name (.npy); if given with the shape, the values are written directly in a memory-mapped grid file
+
+    Returns:
+
+    * values: 2D-array = (nx, ny)
+        gridded data set, with the x-direction along the first axis and increasing coordinates
+    * header: dictionary
+        'shape' = (nx, ny), 'spacing' = (dx, dy) and 'origin' = (xmin, ymin)
+    """
+
+    values = origin = None
+    used = np.zeros(2, dtype=np.int64)
+    extent = np.zeros(2)
+    count = 0
+
+    for chunk in _xyz_chunks(xyz_file, chunk_rows):
+
+        coords = chunk[:, :2]
+
+        if origin is None:
+
+            if len(coords) < 2:
+                raise ValueError("%s has less than two points" % xyz_file)
+
+            origin = coords[0].copy()
+
+            # The fast direction is the coordinate that changes between the first two rows
+            fast = 0 if coords[1, 0] != origin[0] else 1
+            slow = 1 - fast
+
+            step = np.zeros(2)
+            step[fast] = coords[1, fast] - origin[fast]
+
+            if shape is not None:
+                if filename is not None:
+                    values = np.lib.format.open_memmap(filename, mode='w+', dtype=np.float64, shape=tuple(shape))
+                    values[...] = np.nan
+                else:
+                    values = np.full(shape, np.nan)
+
+        # Spacing of the slow direction at its first change
+        if step[slow] == 0:
+
+            change = np.nonzero(coords[:, slow] != origin[slow])[0]
+
+            if change.size:
+                step[slow] = coords[change[0], slow] - origin[slow]
+
+        unit = np.where(step == 0, 1.0, step)
+        index = np.rint((coords - origin) / unit).astype(np.int64)
+
+        off = np.any(np.abs(origin + index * step - coords) > 1e-3 * np.abs(unit), axis=1) | np.any(index < 0, axis=1)
+
+        if shape is not None:
+            off |= np.any(index >= np.asarray(shape), axis=1)
+
+        if np.any(off):
+            row = np.nonzero(off)[0][0]
+            raise ValueError("%s: point %s (row %d) is not on the regular grid" % (xyz_file, coords[row], count + row + 1))
+
+        used = np.maximum(used, index.max(axis=0) + 1)
+        extent = np.maximum(extent, np.abs(coords - origin).max(axis=0))
+
+        if shape is None and (values is None or np.any(used > values.shape)):
+
+            # Geometric growth of the array along the directions that overflow
+            current = np.zeros(2, dtype=np.int64) if values is None else np.asarray(values.shape)
+            grown = np.full(np.where(used > current, np.maximum(used, 2 * current), current), np.nan)
+
+            if values is not None:
+                grown[:values.shape[0], :values.shape[1]] = values
+
+            values = grown
+
+        # The order of decreasing coordinates is reversed at the end, when the sign of both steps is known
+        values[index[:, 0], index[:, 1]] = chunk[:, column]
+
+        count += len(chunk)
+
+    if origin is None:
+        raise ValueError("%s contains no data" % xyz_file)
+
+    if shape is None:
+
+        values = values[:used[0], :used[1]]
+
+        if step[0] < 0:
+            values = values[::-1]
+        if step[1] < 0:
+            values = values[:, ::-1]
+
+    else:
+
+        # In place, a few rows at a time, so that a memory-mapped grid is not loaded in memory
+        if step[0] < 0:
+            for i in range(values.shape[0] // 2):
+                values[[i, -1 - i]] = values[[-1 - i, i]]
+        if step[1] < 0:
+            for i in range(values.shape[0]):
+                values[i] = values[i, ::-1].copy()
+
+    nx, ny = values.shape
+
+    # Spacing over the whole extent of the grid, more accurate than the first step
+    spacing = tuple(float(e / (n - 1)) if n > 1 else 1.0 for e, n in zip(extent, used))
+    xmin = origin[0] - extent[0] * (step[0] < 0)
+    ymin = origin[1] - extent[1] * (step[1] < 0)
+
+    header = {'shape': (nx, ny), 'spacing': spacing, 'origin': (float(xmin), float(ymin))}
+
+    # Nodes that received no value (rows repeating a node do not fill another one)
+    missing = int(np.count_nonzero(np.isnan(values)))
+    repeated = count - (values.size - missing)
+
+    if missing > 0:
+        warnings.warn("%s: %d missing grid nodes are set to NaN" % (xyz_file, missing))
+
+    if repeated > 0:
+        warnings.warn("%s: %d rows repeat a grid node, the last value is kept" % (xyz_file, repeated))
+
+    if filename is not None:
+
+        if shape is None:
+            save_grid(filename, values, spacing, header['origin'])
+            return load_grid(filename)
+
+        values.flush()
+        write_header(filename, (nx, ny), spacing, header['origin'])
+
+        return values, header
+
+    return np.ascontiguousarray(values), header
+
+
+
+def xyz_to_grid(xyz_file, filename, column=-1, shape=None):
+
+    """
+    Converts an XYZ text file of a regular grid (one point per row: x, y, ..., value, with x or y varying fastest) into the binary 
+    format, reading it in chunks (see read_xyz). This is meant to be run once per input file.
+
+    Parameters:
+
+    * xyz_file: string
+        XYZ text file name (e.g. 'input/synthetic_data.dat')
+    * filename: string
+        grid file name (.npy)
+    * column: integer
+        column of the values
+    * shape: tuple = (nx, ny)
+        data points number in each direction, if known
+
+    Returns:
+
+    * values: 2D-array = (nx, ny)
+        gridded data set (memory-mapped)
+    * header: dictionary
+        grid header (see read_header)
+    """
+
+    read_xyz(xyz_file, column, shape, filename=filename)
+
+    return load_grid(filename)
@@ -15,67 +15,116 @@ email: janaina.melo@usp.br (J.A. Melo); carlos.mendonca@iag.usp.br (C.A. Mendon
 """
 
 
+import os
+
 import numpy as np
-import matplotlib.pyplot as plt
+import matplotlib
+from matplotlib.colors import BoundaryNorm
+from matplotlib.figure import Figure
 from matplotlib.path import Path
 from matplotlib.patches import PathPatch
 
+import profiling
+
+
+
+def _levels(values, number):
+
+    """
+    Levels of the filled contours and ticks (5) of the colorbar of a data set, from its minimum and maximum computed once.
+    """
+
+    vmin, vmax = np.min(values), np.max(values)
+
+    return np.linspace(vmin, vmax, number, endpoint=True), np.linspace(vmin, vmax, 5, endpoint=True)
+
+
+
+@profiling.profiled('plot_panel')
+def _panel(ax, h, v, values, levels, cmap, shape=None, image=False):
+
+    """
+    Draws a data set on a panel with the coordinates h (horizontal axis) and v (vertical axis): filled contours on the scattered
+    points (no shape, Delaunay triangulation), filled contours on the 2D-arrays of the regular grid (shape), or an image of the grid
+    with one color per contour interval (shape and image=True). Returns the drawn object, for the colorbar.
+    """
+
+    if shape is None:
+        return ax.tricontourf(h, v, values, 30, cmap=cmap, levels=levels)
+
+    h, v, values = np.reshape(h, shape), np.reshape(v, shape), np.reshape(values, shape)
+
+    if not image:
+
+        # Axes limits on the data (not on the polygons drawn afterwards), as with the triangulation
+        ax.set_xlim(np.min(h), np.max(h))
+        ax.set_ylim(np.min(v), np.max(v))
+
+        return ax.contourf(h, v, values, cmap=cmap, levels=levels)
+
+    # Image rows along the vertical axis
+    if np.ptp(h[:, 0]) > np.ptp(h[0]):
+        h, v, values = h.T, v.T, values.T
+
+    nv, nh = values.shape
+    dh = (h[0, -1] - h[0, 0]) / max(nh - 1, 1)
+    dv = (v[-1, 0] - v[0, 0]) / max(nv - 1, 1)
+
+    # Values outside the levels are left blank, as in the filled contours
+    colors = matplotlib.colormaps[cmap].with_extremes(under='none', over='none')
+
+    return ax.imshow(values, cmap=colors, norm=BoundaryNorm(levels, colors.N), origin='lower', aspect='auto',
+                     interpolation='nearest', extent=(h[0, 0] - dh / 2, h[0, -1] + dh / 2, v[0, 0] - dv / 2, v[-1, 0] + dv / 2))
+
+
 
-def plot_figure1(x, y, tfa, asa, reg_asa, tdr, reg_tdr, vertices):
+@profiling.profiled('plot_figure1')
+def plot_figure1(x, y, tfa, asa, reg_asa, tdr, reg_tdr, vertices, shape=None, image=False):
 
-    fig, ax = plt.subplots(nrows=3, ncols=2, figsize=(7, 10))
+    """
+    Plots the total-field anomaly, non-regularized and regularized ASA and TDR of the synthetic data (figures/FIG1.png).
+
+    With the shape of the grid, the data sets are drawn on 2D-arrays instead of being triangulated, which is much faster on large
+    grids; with image=True, they are drawn as images (fastest).
+    """
+
+    fig = Figure(figsize=(7, 10))
+    ax = fig.subplots(nrows=3, ncols=2)
 
     ax[0][1].axis('off')
 
-    v1 = np.linspace(min(tfa), max(tfa), 20, endpoint=True)
-    v1_ = np.linspace(min(tfa), max(tfa), 5, endpoint=True)
-    v2 = np.linspace(min(reg_asa * 1000), max(reg_asa * 1000), 20, endpoint=True)
-    v2_ = np.linspace(min(reg_asa * 1000), max(reg_asa * 1000), 5, endpoint=True)
-    v3 = np.linspace(min(reg_tdr), max(reg_tdr), 20, endpoint=True)
-    v3_ = np.linspace(min(reg_tdr), max(reg_tdr), 5, endpoint=True)
+    v1, v1_ = _levels(tfa, 20)
+    v2, v2_ = _levels(reg_asa * 1000, 20)
+    v3, v3_ = _levels(reg_tdr, 20)
 
-    tmp1 = ax[0][0].tricontourf(y/1000, x/1000, tfa, 30, cmap='gist_ncar', levels=v1)
-    tmp2 = ax[1][0].tricontourf(y/1000, x/1000, asa * 1000, 30, cmap='gist_ncar', levels=v2)
-    tmp3 = ax[1][1].tricontourf(y/1000, x/1000, reg_asa * 1000, 30, cmap='gist_ncar', levels=v2)
-    tmp4 = ax[2][0].tricontourf(y/1000, x/1000, tdr, 30, cmap='gist_ncar', levels=v3)
-    tmp5 = ax[2][1].tricontourf(y/1000, x/1000, reg_tdr, 30, cmap='gist_ncar', levels=v3)
+    tmp1 = _panel(ax[0][0], y/1000, x/1000, tfa, v1, 'gist_ncar', shape, image)
+    tmp2 = _panel(ax[1][0], y/1000, x/1000, asa * 1000, v2, 'gist_ncar', shape, image)
+    tmp3 = _panel(ax[1][1], y/1000, x/1000, reg_asa * 1000, v2, 'gist_ncar', shape, image)
+    tmp4 = _panel(ax[2][0], y/1000, x/1000, tdr, v3, 'gist_ncar', shape, image)
+    tmp5 = _panel(ax[2][1], y/1000, x/1000, reg_tdr, v3, 'gist_ncar', shape, image)
 
 
-    plt.colorbar(tmp1, ax=ax[0][0], fraction=0.030, aspect=20, spacing='uniform', format='%.f', orientation='vertical',
+    fig.colorbar(tmp1, ax=ax[0][0], fraction=0.030, aspect=20, spacing='uniform', format='%.f', orientation='vertical',
                       ticks=v1_).set_label('(nT)', fontsize=10, labelpad=-20, y=-0.10, rotation=0)
 
-    plt.colorbar(tmp2, ax=ax[1][0], fraction=0.030, aspect=20, spacing='uniform', format='%.f', orientation='vertical',
+    fig.colorbar(tmp2, ax=ax[1][0], fraction=0.030, aspect=20, spacing='uniform', format='%.f', orientation='vertical',
                       ticks=v2_).set_label('(nT/km)', fontsize=10, labelpad=-15, y=-0.10, rotation=0)
 
-    plt.colorbar(tmp3, ax=ax[1][1], fraction=0.030, aspect=20, spacing='uniform', format='%.f', orientation='vertical',
+    fig.colorbar(tmp3, ax=ax[1][1], fraction=0.030, aspect=20, spacing='uniform', format='%.f', orientation='vertical',
                       ticks=v2_).set_label('(nT/km)', fontsize=10, labelpad=-15, y=-0.10, rotation=0)
 
-    plt.colorbar(tmp4, ax=ax[2][0], fraction=0.030, aspect=20, spacing='uniform', format='%.1f', orientation='vertical',
+    fig.colorbar(tmp4, ax=ax[2][0], fraction=0.030, aspect=20, spacing='uniform', format='%.1f', orientation='vertical',
                       ticks=v3_).set_label('(rad)', fontsize=10, labelpad=-20, y=-0.10, rotation=0)
 
-    plt.colorbar(tmp5, ax=ax[2][1], fraction=0.030, aspect=20, spacing='uniform', format='%.1f', orientation='vertical',
+    fig.colorbar(tmp5, ax=ax[2][1], fraction=0.030, aspect=20, spacing='uniform', format='%.1f', orientation='vertical',
                       ticks=v3_).set_label('(rad)', fontsize=10, labelpad=-20, y=-0.10, rotation=0)
 
 
-    # Draw the polygons
-    for b in vertices:
-        path1 = Path(b)
-        path2 = Path(b)
-        path3 = Path(b)
-        path4 = Path(b)
-        path5 = Path(b)
-
-        pathpatch1 = PathPatch(path1, facecolor='none', edgecolor='black', linewidth=1.5)
-        pathpatch2 = PathPatch(path2, facecolor='none', edgecolor='black', linewidth=1.5)
-        pathpatch3 = PathPatch(path3, facecolor='none', edgecolor='black', linewidth=1.5)
-        pathpatch4 = PathPatch(path4, facecolor='none', edgecolor='black', linewidth=1.5)
-        pathpatch5 = PathPatch(path5, facecolor='none', edgecolor='black', linewidth=1.5)
+    # Draw the polygons (one path of all the polygons, shared by the panels)
+    polygons = Path.make_compound_path(*[Path(b) for b in vertices])
 
-        ax[0][0].add_patch(pathpatch1)
-        ax[1][0].add_patch(pathpatch2)
-        ax[1][1].add_patch(pathpatch3)
-        ax[2][0].add_patch(pathpatch4)
-        ax[2][1].add_patch(pathpatch5)
+    for panel in (ax[0][0], ax[1][0], ax[1][1], ax[2][0], ax[2][1]):
+        panel.add_patch(PathPatch(polygons, facecolor='none', edgecolor='black', linewidth=1.5))
 
 
     ax[0][0].set_xlabel('y (km)', fontsize=11)
@@ -128,18 +177,20 @@ def plot_figure1(x, y, tfa, asa, reg_asa, tdr, reg_tdr, vertices):
     ax[2][0].tick_params(axis='both', which='major', labelsize=10)
     ax[2][1].tick_params(axis='both', which='major', labelsize=10)
 
-    plt.subplots_adjust(wspace=0.55, hspace=0.5)
+    fig.subplots_adjust(wspace=0.55, hspace=0.5)
 
-    plt.savefig('figures/FIG1.png', bbox_inches='tight', dpi=600)
-    plt.close('all')
+    with profiling.stage('savefig'):
+        fig.savefig('figures/FIG1.png', bbox_inches='tight', dpi=600)
 
     return
 
 
 
+@profiling.profiled('plot_figure2')
 def plot_figure2(alpha, norm_sol_dx, norm_sol_dy, norm_sol_dz, alpha_vector):
 
-    fig, ax = plt.subplots(figsize=(4, 3))
+    fig = Figure(figsize=(4, 3))
+    ax = fig.subplots()
 
     ax.plot(np.log10(alpha), norm_sol_dx, '-', color='blue', markersize=6, label='S$_x$')
     ax.plot(np.log10(alpha), norm_sol_dy, color='red', markersize=6, label='S$_y$')
@@ -163,46 +214,52 @@ def plot_figure2(alpha, norm_sol_dx, norm_sol_dy, norm_sol_dz, alpha_vector):
     ax.tick_params(axis='both', which='major', labelsize=8)
     ax.legend(loc='best', fontsize=8, edgecolor='black')
 
-    plt.savefig('figures/FIG2.png', bbox_inches='tight', dpi=600)
-    plt.close('all')
+    with profiling.stage('savefig'):
+        fig.savefig('figures/FIG2.png', bbox_inches='tight', dpi=600)
 
     return
 
 
 
-def plot_figure3(x, y, tfa, asa, reg_asa, tdr, reg_tdr):
+@profiling.profiled('plot_figure3')
+def plot_figure3(x, y, tfa, asa, reg_asa, tdr, reg_tdr, shape=None, image=False):
 
-    fig, ax = plt.subplots(nrows=3, ncols=2, figsize=(7, 10))
+    """
+    Plots the total-field anomaly, non-regularized and regularized ASA and TDR of the real data (figures/FIG3.png).
+
+    With the shape of the grid, the data sets are drawn on 2D-arrays instead of being triangulated, which is much faster on large
+    grids; with image=True, they are drawn as images (fastest).
+    """
+
+    fig = Figure(figsize=(7, 10))
+    ax = fig.subplots(nrows=3, ncols=2)
 
     ax[0][1].axis('off')
 
-    v1 = np.linspace(min(tfa), max(tfa), 25, endpoint=True)
-    v1_ = np.linspace(min(tfa), max(tfa), 5, endpoint=True)
-    v2 = np.linspace(min(reg_asa * 1000), max(reg_asa * 1000), 25, endpoint=True)
-    v2_ = np.linspace(min(reg_asa * 1000), max(reg_asa * 1000), 5, endpoint=True)
-    v3 = np.linspace(min(reg_tdr), max(reg_tdr), 25, endpoint=True)
-    v3_ = np.linspace(min(reg_tdr), max(reg_tdr), 5, endpoint=True)
+    v1, v1_ = _levels(tfa, 25)
+    v2, v2_ = _levels(reg_asa * 1000, 25)
+    v3, v3_ = _levels(reg_tdr, 25)
 
-    tmp1 = ax[0][0].tricontourf(x/1000, y/1000, tfa, 30, cmap='gist_ncar', levels=v1)
-    tmp2 = ax[1][0].tricontourf(x/1000, y/1000, asa * 1000, 30, cmap='binary', levels=v2)
-    tmp3 = ax[1][1].tricontourf(x/1000, y/1000, reg_asa * 1000, 30, cmap='binary', levels=v2)
-    tmp4 = ax[2][0].tricontourf(x/1000, y/1000, tdr, 30, cmap='gist_gray', levels=v3)
-    tmp5 = ax[2][1].tricontourf(x/1000, y/1000, reg_tdr, 30, cmap='gist_gray', levels=v3)
+    tmp1 = _panel(ax[0][0], x/1000, y/1000, tfa, v1, 'gist_ncar', shape, image)
+    tmp2 = _panel(ax[1][0], x/1000, y/1000, asa * 1000, v2, 'binary', shape, image)
+    tmp3 = _panel(ax[1][1], x/1000, y/1000, reg_asa * 1000, v2, 'binary', shape, image)
+    tmp4 = _panel(ax[2][0], x/1000, y/1000, tdr, v3, 'gist_gray', shape, image)
+    tmp5 = _panel(ax[2][1], x/1000, y/1000, reg_tdr, v3, 'gist_gray', shape, image)
 
 
-    plt.colorbar(tmp1, ax=ax[0][0], fraction=0.030, aspect=20, spacing='uniform', format='%.f', orientation='vertical',
+    fig.colorbar(tmp1, ax=ax[0][0], fraction=0.030, aspect=20, spacing='uniform', format='%.f', orientation='vertical',
                       ticks=v1_).set_label('(nT)', fontsize=10, labelpad=-20, y=-0.10, rotation=0)
 
-    plt.colorbar(tmp2, ax=ax[1][0], fraction=0.030, aspect=20, spacing='uniform', format='%.f', orientation='vertical',
+    fig.colorbar(tmp2, ax=ax[1][0], fraction=0.030, aspect=20, spacing='uniform', format='%.f', orientation='vertical',
                       ticks=v2_).set_label('(nT/km)', fontsize=10, labelpad=-15, y=-0.10, rotation=0)
 
-    plt.colorbar(tmp3, ax=ax[1][1], fraction=0.030, aspect=20, spacing='uniform', format='%.f', orientation='vertical',
+    fig.colorbar(tmp3, ax=ax[1][1], fraction=0.030, aspect=20, spacing='uniform', format='%.f', orientation='vertical',
                       ticks=v2_).set_label('(nT/km)', fontsize=10, labelpad=-15, y=-0.10, rotation=0)
 
-    plt.colorbar(tmp4, ax=ax[2][0], fraction=0.030, aspect=20, spacing='uniform', format='%.1f', orientation='vertical',
+    fig.colorbar(tmp4, ax=ax[2][0], fraction=0.030, aspect=20, spacing='uniform', format='%.1f', orientation='vertical',
                       ticks=v3_).set_label('(rad)', fontsize=10, labelpad=-20, y=-0.10, rotation=0)
 
-    plt.colorbar(tmp5, ax=ax[2][1], fraction=0.030, aspect=20, spacing='uniform', format='%.1f', orientation='vertical',
+    fig.colorbar(tmp5, ax=ax[2][1], fraction=0.030, aspect=20, spacing='uniform', format='%.1f', orientation='vertical',
                       ticks=v3_).set_label('(rad)', fontsize=10, labelpad=-20, y=-0.10, rotation=0)
 
 
@@ -240,18 +297,20 @@ def plot_figure3(x, y, tfa, asa, reg_asa, tdr, reg_tdr):
     ax[2][0].text(-37.5, 8312, 'd)', fontsize=14, horizontalalignment='center', verticalalignment='center')
     ax[2][1].text(-37.5, 8312, 'e)', fontsize=14, horizontalalignment='center', verticalalignment='center')
 
-    plt.subplots_adjust(wspace=0.6, hspace=0.5)
+    fig.subplots_adjust(wspace=0.6, hspace=0.5)
 
-    plt.savefig('figures/FIG3.png', bbox_inches='tight', dpi=600)
-    plt.close('all')
+    with profiling.stage('savefig'):
+        fig.savefig('figures/FIG3.png', bbox_inches='tight', dpi=600)
 
     return
 
 
 
+@profiling.profiled('plot_figure4')
 def plot_figure4(alpha, norm_sol_dx, norm_sol_dy, norm_sol_dz, alpha_vector):
 
-    fig, ax = plt.subplots(figsize=(4, 3))
+    fig = Figure(figsize=(4, 3))
+    ax = fig.subplots()
 
     ax.plot(np.log10(alpha), norm_sol_dx, '-', color='blue', markersize=6, label='S$_x$')
     ax.plot(np.log10(alpha), norm_sol_dy, color='red', markersize=6, label='S$_y$')
@@ -274,7 +333,49 @@ def plot_figure4(alpha, norm_sol_dx, norm_sol_dy, norm_sol_dz, alpha_vector):
     ax.tick_params(axis='both', which='major', labelsize=8)
     ax.legend(loc='best', fontsize=8, edgecolor='black')
 
-    plt.savefig('figures/FIG4.png', bbox_inches='tight', dpi=600)
-    plt.close('all')
+    with profiling.stage('savefig'):
+        fig.savefig('figures/FIG4.png', bbox_inches='tight', dpi=600)
+
+    return
+
+
+
+def _render(task):
+
+    """
+    Generates a figure from a tuple (plot function, arguments) (worker pool task).
+    """
+
+    function, args = task
+
+    return function(*args)
+
+
+
+def render_figures(figures, n_jobs=1):
+
+    """
+    Generates several figures, in parallel worker processes if n_jobs > 1. The figures are drawn by the Agg backend of matplotlib
+    (no display is needed), so the workers are independent.
+
+    Parameters:
+
+    * figures: list
+        tuples (plot function, arguments), e.g. [(plot_figure1, (x, y, tfa, asa, reg_asa, tdr, reg_tdr, model, shape)),
+        (plot_figure2, (alpha_test, norm_sol_dx, norm_sol_dy, norm_sol_dz, alpha_vector))]
+    * n_jobs: integer
+        number of worker processes (-1 uses all the processors)
+    """
+
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count() or 1
+
+    if n_jobs == 1 or len(figures) < 2:
+        for task in figures:
+            _render(task)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
 
-    return
\ No newline at end of file
+    with ProcessPoolExecutor(min(n_jobs, len(figures))) as executor:
+        list(executor.map(_render, figures))
@@ -0,0 +1,336 @@
+"""
+Profiling
+
+A Python module to measure the stages of a run (reading the data, padding, forward and inverse transforms, S-function, choice of the
+regularization parameters, ASA and TDR, plots): wall time, number of calls, memory allocated and peak resident memory of each stage.
+
+The functions of "filtering.py", "grid_io.py" and "plot_figure.py" are instrumented, and the profiling is disabled by default (the
+instrumented functions then only check a flag). It is enabled by enable(), or without changing the code by the environment variable
+STAIRCASE_PROFILE, whose value is the JSON file written at the end of the run:
+
+    STAIRCASE_PROFILE=results/profile.json python real_data.py
+
+The times of nested stages are inclusive (e.g. 's_function_norms' includes its 'inverse_fft' calls). The stages run by worker
+processes are not recorded; those run by threads are. The memory of the stages requires Python 3.9 (only the times are recorded
+with older versions); tracemalloc is imported by enable(), so importing this module also works with Python 2.7.
+
+This code is released from the paper: Python programs to apply regularized derivatives in the magnetic tilt derivative and gradient intensity data
+processing: a graphical procedure to choose the regularization parameter.
+
+The program is under the conditions terms in the file README.txt.
+
+authors:Janaína A. Melo (IAG-USP), Carlos A. Mendonça (IAG-USP) and Yara R. Marangoni (IAG-USP) (2023)
+email: janaina.melo@usp.br (J.A. Melo); carlos.mendonca@iag.usp.br (C.A. Mendonça); yaramaran@usp.br. (Y.R. Marangoni)
+"""
+
+import atexit
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import warnings
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+
+# State of the profiling (see enable); tracemalloc is imported when the memory is traced
+_state = {'enabled': False, 'memory': False, 'log': None, 'tracemalloc': None}
+
+# Wall clock of the stages (time.perf_counter is not available in Python 2.7)
+_clock = getattr(time, 'perf_counter', time.time)
+
+# Statistics of the stages, by name
+_stages = {}
+_lock = threading.Lock()
+
+# Stages being run by each thread (memory peaks of the nested stages)
+_local = threading.local()
+
+
+
+def enable(memory=True, log=None):
+
+    """
+    Enables the profiling of the stages.
+
+    Parameters:
+
+    * memory: boolean
+        if True, the memory allocated by each stage is traced with tracemalloc (which slows down the allocations); it requires 
+        Python 3.9 (tracemalloc.reset_peak), and only the times are recorded with older versions
+    * log: file
+        stream where a JSON line is written at the end of each stage (None: no log)
+    """
+
+    tracemalloc = None
+
+    if memory:
+
+        try:
+            import tracemalloc
+        except ImportError:
+            pass
+
+        if not hasattr(tracemalloc, 'reset_peak'):
+            warnings.warn("the memory of the stages requires Python 3.9 (tracemalloc.reset_peak), only the times are recorded")
+            tracemalloc, memory = None, False
+
+    _state['enabled'] = True
+    _state['memory'] = memory
+    _state['log'] = log
+    _state['tracemalloc'] = tracemalloc
+
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+
+def disable():
+
+    """
+    Disables the profiling. The statistics are kept until reset.
+    """
+
+    _state['enabled'] = False
+    tracemalloc = _state['tracemalloc']
+
+    if _state['memory'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+    _state['memory'] = False
+    _state['tracemalloc'] = None
+
+
+
+def reset():
+
+    """
+    Removes the statistics of all the stages.
+    """
+
+    with _lock:
+        _stages.clear()
+
+
+
+def peak_rss():
+
+    """
+    Returns the peak resident memory of the process in bytes (None where the 'resource' module is not available).
+    """
+
+    if resource is None:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+
+@contextlib.contextmanager
+def stage(name):
+
+    """
+    Context manager that records a stage: wall time, call count and, with the memory tracing, the net memory allocated and the peak of
+    memory above the memory in use at its start. Nothing is recorded while the profiling is disabled.
+
+    Parameters:
+
+    * name: string
+        name of the stage
+    """
+
+    if not _state['enabled']:
+        yield
+        return
+
+    tracemalloc = _state['tracemalloc']
+    memory = _state['memory'] and tracemalloc.is_tracing()
+    frames = _local.__dict__.setdefault('frames', [])
+
+    if memory:
+        current, peak = tracemalloc.get_traced_memory()
+
+        # The peak of the enclosing stage so far, before the peak of the traced memory is reset for this one
+        if frames:
+            frames[-1] = max(frames[-1], peak)
+
+        tracemalloc.reset_peak()
+        frames.append(current)
+        start_memory = current
+
+    start = _clock()
+
+    try:
+        yield
+
+    finally:
+
+        elapsed = _clock() - start
+        allocated = peak_bytes = 0
+
+        if memory:
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(frames.pop(), peak)
+            allocated, peak_bytes = current - start_memory, peak - start_memory
+
+            if frames:
+                frames[-1] = max(frames[-1], peak)
+
+        rss = peak_rss()
+
+        with _lock:
+
+            stats = _stages.setdefault(name, {'calls': 0, 'time': 0.0, 'max_time': 0.0, 'bytes': 0, 'peak_bytes': 0,
+                                              'peak_rss': None})
+            stats['calls'] += 1
+            stats['time'] += elapsed
+            stats['max_time'] = max(stats['max_time'], elapsed)
+            stats['bytes'] += allocated
+            stats['peak_bytes'] = max(stats['peak_bytes'], peak_bytes)
+            stats['peak_rss'] = rss
+
+        if _state['log'] is not None:
+            _state['log'].write(json.dumps({'stage': name, 'time': elapsed, 'bytes': allocated, 'peak_bytes': peak_bytes,
+                                            'peak_rss': rss}) + '\n')
+
+
+
+def profiled(name):
+
+    """
+    Decorator that records each call of a function as a stage (see stage).
+
+    Parameters:
+
+    * name: string
+        name of the stage
+    """
+
+    def decorator(function):
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+
+            if not _state['enabled']:
+                return function(*args, **kwargs)
+
+            with stage(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+
+def report():
+
+    """
+    Returns the statistics of the stages.
+
+    Returns:
+
+    * report: dictionary
+        'stages': for each stage, 'calls', 'time' (total, s), 'max_time' (longest call, s), 'bytes' (net memory allocated),
+        'peak_bytes' (largest memory peak of a call above the memory in use at its start) and 'peak_rss' (peak resident memory of
+        the process at the end of its last call, bytes); 'peak_rss': peak resident memory of the process
+    """
+
+    with _lock:
+        stages = dict((name, dict(stats)) for name, stats in _stages.items())
+
+    return {'stages': stages, 'peak_rss': peak_rss()}
+
+
+
+def save(filename):
+
+    """
+    Writes the statistics of the stages (see report) in a JSON file.
+
+    Parameters:
+
+    * filename: string
+        JSON file name
+    """
+
+    with open(filename, 'w') as f:
+        json.dump(report(), f, indent=2)
+
+
+
+def summary(stream=None):
+
+    """
+    Prints the statistics of the stages as a table, the longest stages first.
+
+    Parameters:
+
+    * stream: file
+        output stream (sys.stdout by default)
+    """
+
+    stream = sys.stdout if stream is None else stream
+    stages = report()['stages']
+
+    stream.write('%-32s %8s %12s %12s %12s\n' % ('stage', 'calls', 'time (s)', 'bytes (MB)', 'peak (MB)'))
+
+    for name in sorted(stages, key=lambda name: -stages[name]['time']):
+        stats = stages[name]
+        stream.write('%-32s %8d %12.4f %12.1f %12.1f\n' % (name, stats['calls'], stats['time'], stats['bytes'] / 2.0 ** 20,
+                                                         stats['peak_bytes'] / 2.0 ** 20))
+
+
+
+@contextlib.contextmanager
+def cprofile(filename):
+
+    """
+    Context manager that runs the enclosed code under cProfile and writes the statistics to a file, to be read with pstats or a
+    viewer such as snakeviz. Sampling profilers (e.g. py-spy) need no hook: the instrumented functions keep their names in the
+    stack traces.
+
+    Parameters:
+
+    * filename: string
+        statistics file name (e.g. 'results/run.prof')
+    """
+
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(filename)
+
+
+
+def _enable_from_environment():
+
+    """
+    Enables the profiling if the environment variable STAIRCASE_PROFILE is set, and writes the JSON file it names at exit.
+    """
+
+    filename = os.environ.get('STAIRCASE_PROFILE')
+
+    if filename:
+        enable(memory=os.environ.get('STAIRCASE_PROFILE_MEMORY', '1') != '0')
+        atexit.register(save, filename)
+
+
+
+_enable_from_environment()
@@ -33,11 +33,13 @@ Parameters:
 import numpy as np
 from filtering import *
 from plot_figure import *
+import profiling
 
 
 
 # Input data
-data = np.loadtxt("input/real_data.xyz")
+with profiling.stage('loadtxt'):
+    data = np.loadtxt("input/real_data.xyz")
 
 x = data[:,0]                         # x coordinates (m)
 y = data[:,1]                         # y coordinates (m)
@@ -101,7 +103,7 @@ reg_asa, reg_tdr = asa_tdr(reg_dx_tfa, reg_dy_tfa, reg_dz_tfa)
 '''
 Plot the total-field anomaly, non-regularized and regularized ASA, and non-regularized and regularized TDR - Figure 3
 '''
-plot_figure3(x, y, tfa, asa, reg_asa, tdr, reg_tdr)
+plot_figure3(x, y, tfa, asa, reg_asa, tdr, reg_tdr, shape)
 
 
 '''
@@ -0,0 +1,327 @@
+"""
+Command-line tool
+
+A command-line interface to the functions in "filtering.py", "grid_io.py" and "batch.py", for headless processing:
+
+    python staircase.py sfunction input/synthetic_data.dat --output results/sfunction.json
+    python staircase.py sfunction input/synthetic_data.dat --cache cache --upper-limit 0.8
+    python staircase.py derivatives input/synthetic_data.dat --alpha 5.1 --prefix results/synthetic
+    python staircase.py asa-tdr input/synthetic_data.dat --alpha 5.1 --prefix results/synthetic
+    python staircase.py asa-tdr input/synthetic_data.dat --alpha 6.0 5.0 5.1 --prefix results/synthetic_xyz
+    python staircase.py run grids/ --output-dir results/
+
+The input grids are binary grids of 'grid_io.py' (.npy) or XYZ text files (one point per row: x, y, ..., value). The results are
+saved as binary grids. The modules (and numpy) are imported only by the command that needs them and matplotlib is never imported,
+so the tool starts quickly when it is called many times by a job scheduler.
+
+The x- and y-directions are the coordinates of the files (the x-coordinate along the first axis of the grids, see grid_io.read_xyz).
+The scripts of the paper reshape the values of the same files with the x-coordinate along the second axis, so their parameters of
+the x- and y-derivatives are the parameters of the y- and x-coordinates here: for the synthetic data, synthetic_data.py prints
+alpha_x = 5.0 and alpha_y = 6.0, and the 'sfunction' command gives alpha_x = 6.0 and alpha_y = 5.0 (hence '--alpha 6.0 5.0 5.1'
+above). Per-direction parameters copied from the scripts are passed to --alpha as (alpha_y, alpha_x, alpha_z) of the scripts.
+
+This code is released from the paper: Python programs to apply regularized derivatives in the magnetic tilt derivative and gradient intensity data
+processing: a graphical procedure to choose the regularization parameter.
+
+The program is under the conditions terms in the file README.txt.
+
+authors:Janaína A. Melo (IAG-USP), Carlos A. Mendonça (IAG-USP) and Yara R. Marangoni (IAG-USP) (2023)
+email: janaina.melo@usp.br (J.A. Melo); carlos.mendonca@iag.usp.br (C.A. Mendonça); yaramaran@usp.br. (Y.R. Marangoni)
+"""
+
+import argparse
+import json
+import sys
+
+
+
+def _load(filename, dtype):
+
+    """
+    Loads a binary grid (.npy) or an XYZ text file. Returns the values (2D-array of the given type), the header and the coordinates 
+    mesh.
+    """
+
+    import numpy as np
+    import grid_io
+
+    if filename.endswith('.npy'):
+        values, header = grid_io.load_grid(filename)
+    else:
+        values, header = grid_io.read_xyz(filename)
+
+    x, y = grid_io.grid_coordinates(header)
+
+    return np.asarray(values, dtype=dtype), header, x, y
+
+
+
+def _alpha_test(args):
+
+    """
+    Trial regularization parameters of the command-line options.
+    """
+
+    import numpy as np
+
+    return 10 ** np.arange(args.alpha_min, args.alpha_max + args.alpha_step / 2, args.alpha_step)
+
+
+
+def _setup(args):
+
+    """
+    Applies the FFT backend options and returns the filtering module.
+    """
+
+    import filtering
+
+    filtering.set_fft_backend(args.backend, args.workers)
+
+    return filtering
+
+
+
+def _alpha(args):
+
+    """
+    Regularization parameter of the --alpha option: one value, or one per direction (x, y, z).
+    """
+
+    if len(args.alpha) == 1:
+        return 10 ** args.alpha[0]
+
+    return tuple(10 ** alpha for alpha in args.alpha)
+
+
+
+def _padding(value):
+
+    """
+    Parses the --padding option: a mode name or a width.
+    """
+
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+
+def _save(prefix, products, header):
+
+    """
+    Saves result grids as '<prefix>_<product>.npy' and returns their file names.
+    """
+
+    import grid_io
+
+    outputs = {}
+
+    for product, values in products:
+        outputs[product] = '%s_%s.npy' % (prefix, product)
+        grid_io.save_grid(outputs[product], values, header['spacing'], header['origin'])
+
+    return outputs
+
+
+
+def sfunction(args):
+
+    """
+    'sfunction' command: S-function and regularization parameters of a grid.
+    """
+
+    filtering = _setup(args)
+
+    if args.cache:
+        filtering.set_norm_cache(args.cache)
+
+    values, header, x, y = _load(args.grid, args.dtype)
+    alpha_test = _alpha_test(args)
+
+    norms = filtering.s_function(x, y, values, header['shape'], alpha_test, method=args.method, rfft=args.rfft,
+                                 padding=args.padding, dtype=args.dtype)
+
+    if args.auto:
+        alpha_vector, confidence, limits = filtering.auto_regularization_parameter(norms, alpha_test, args.value_norm)
+        alpha_vector = alpha_vector.tolist()
+    else:
+        alpha_vector = filtering.regularization_parameter(norms, alpha_test, args.upper_limit, args.inferior_limit,
+                                                          args.value_norm).tolist()
+
+    result = {'alpha_test': alpha_test.tolist(), 'norm_sol_dx': norms[0].tolist(), 'norm_sol_dy': norms[1].tolist(),
+              'norm_sol_dz': norms[2].tolist(), 'alpha_x': alpha_vector[0], 'alpha_y': alpha_vector[1],
+              'alpha_z': alpha_vector[2], 'alpha_grid': sum(alpha_vector) / 3}
+
+    if args.auto:
+        result.update(confidence_x=float(confidence[0]), confidence_y=float(confidence[1]), confidence_z=float(confidence[2]),
+                      limits=limits.tolist())
+
+    return result
+
+
+
+def derivatives(args):
+
+    """
+    'derivatives' command: non-regularized (no --alpha) or regularized first-order derivatives of a grid.
+    """
+
+    filtering = _setup(args)
+
+    values, header, x, y = _load(args.grid, args.dtype)
+    shape = header['shape']
+
+    if args.alpha is None:
+        derivs = filtering.nonregularized_derivative(x, y, values, shape, 1, rfft=args.rfft, padding=args.padding,
+                                                     dtype=args.dtype)
+    else:
+        derivs = filtering.regularized_derivative(x, y, values, shape, _alpha(args), rfft=args.rfft, padding=args.padding,
+                                                  dtype=args.dtype)
+
+    products = [(name, deriv.reshape(shape)) for name, deriv in zip(('dx', 'dy', 'dz'), derivs)]
+
+    return {'outputs': _save(args.prefix, products, header)}
+
+
+
+def asa_tdr(args):
+
+    """
+    'asa-tdr' command: analytical signal amplitude and tilt derivative of a grid.
+    """
+
+    filtering = _setup(args)
+
+    values, header, x, y = _load(args.grid, args.dtype)
+    shape = header['shape']
+
+    if args.alpha is None:
+        derivs = filtering.nonregularized_derivative(x, y, values, shape, 1, rfft=args.rfft, padding=args.padding,
+                                                     dtype=args.dtype)
+        names = ('asa', 'tdr')
+    else:
+        derivs = filtering.regularized_derivative(x, y, values, shape, _alpha(args), rfft=args.rfft, padding=args.padding,
+                                                  dtype=args.dtype)
+        names = ('reg_asa', 'reg_tdr')
+
+    asa, tdr = filtering.asa_tdr(*derivs)
+
+    return {'outputs': _save(args.prefix, zip(names, (asa.reshape(shape), tdr.reshape(shape))), header)}
+
+
+
+def run(args):
+
+    """
+    'run' command: full processing of one or many binary grids (see batch.run_batch).
+    """
+
+    _setup(args)
+
+    import batch
+
+    inputs = args.grids[0] if len(args.grids) == 1 and not args.grids[0].endswith('.npy') else args.grids
+
+    upper_limit, inferior_limit = (None, None) if args.auto else (args.upper_limit, args.inferior_limit)
+
+    manifest = batch.run_batch(inputs, args.output_dir, _alpha_test(args), upper_limit, inferior_limit, args.value_norm,
+                               n_jobs=args.jobs, rfft=args.rfft, padding=args.padding, dtype=args.dtype,
+                               per_direction=args.per_direction)
+
+    return {'manifest': manifest}
+
+
+
+def parser():
+
+    """
+    Builds the command-line parser.
+    """
+
+    main = argparse.ArgumentParser(prog='staircase', description='Regularized derivatives and S-function of gridded data.')
+    commands = main.add_subparsers(dest='command')
+    commands.required = True
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--padding', type=_padding, default='square', help="padding mode: square, power2, fast or a width")
+    common.add_argument('--rfft', action='store_true', help='use the real-to-complex transforms')
+    common.add_argument('--backend', default='numpy', choices=('numpy', 'scipy', 'pyfftw'), help='FFT library')
+    common.add_argument('--workers', type=int, default=None, help='FFT threads of the scipy and pyfftw backends')
+    common.add_argument('--dtype', default='float64', choices=('float64', 'float32'), help='precision of the computation')
+    common.add_argument('--profile', help='JSON output file of the time and memory of each processing stage')
+
+    sweep = argparse.ArgumentParser(add_help=False)
+    sweep.add_argument('--alpha-min', type=float, default=-6, help='log10 of the first trial regularization parameter')
+    sweep.add_argument('--alpha-max', type=float, default=14, help='log10 of the last trial regularization parameter')
+    sweep.add_argument('--alpha-step', type=float, default=0.5, help='log10 step of the trial regularization parameters')
+    sweep.add_argument('--value-norm', type=float, default=0.5, help='Euclidean norm-specific value')
+    sweep.add_argument('--upper-limit', type=float, default=0.7, help="upper limit of the S-function's linear interval")
+    sweep.add_argument('--inferior-limit', type=float, default=0.45, help="inferior limit of the S-function's linear interval")
+    sweep.add_argument('--auto', action='store_true', help="detects the S-function's sloped portion (no limits)")
+
+    command = commands.add_parser('sfunction', parents=[common, sweep], help='S-function and regularization parameters')
+    command.add_argument('grid', help='input grid (.npy) or XYZ file')
+    command.add_argument('--method', default='fft', choices=('fft', 'spectral', 'corrected'), help='S-function method')
+    command.add_argument('--cache', help='folder of the on-disk cache of the S-function norms')
+    command.add_argument('--output', help='JSON output file (printed if omitted)')
+    command.set_defaults(function=sfunction)
+
+    for name, function, text in (('derivatives', derivatives, 'first-order derivatives'),
+                                 ('asa-tdr', asa_tdr, 'analytical signal amplitude and tilt derivative')):
+        command = commands.add_parser(name, parents=[common], help=text)
+        command.add_argument('grid', help='input grid (.npy) or XYZ file')
+        command.add_argument('--alpha', type=float, nargs='+', default=None,
+                             help='log10 of the regularization parameter, or of one parameter per direction (x, y, z) of the '
+                                  'file coordinates (the x and y parameters of the paper scripts are swapped); none: non-regularized')
+        command.add_argument('--prefix', required=True, help="prefix of the output grids ('<prefix>_<product>.npy')")
+        command.add_argument('--output', help='JSON output file (printed if omitted)')
+        command.set_defaults(function=function)
+
+    command = commands.add_parser('run', parents=[common, sweep], help='full processing of many grids')
+    command.add_argument('grids', nargs='+', help='input grids (.npy) or a folder of grids')
+    command.add_argument('--output-dir', required=True, help='output folder')
+    command.add_argument('--jobs', type=int, default=1, help='worker processes (-1: all the processors)')
+    command.add_argument('--per-direction', action='store_true', help='regularizes each direction with its own parameter')
+    command.add_argument('--output', help='JSON output file (printed if omitted)')
+    command.set_defaults(function=run)
+
+    return main
+
+
+
+def main(argv=None):
+
+    """
+    Runs the command-line tool.
+    """
+
+    main_parser = parser()
+    args = main_parser.parse_args(argv)
+
+    if getattr(args, 'alpha', None) is not None and len(args.alpha) not in (1, 3):
+        main_parser.error('--alpha takes one value or three values (x, y, z)')
+
+    if args.profile:
+        import profiling
+        profiling.enable()
+
+    result = args.function(args)
+
+    if args.profile:
+        profiling.save(args.profile)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+    return 0
+
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -45,11 +45,13 @@ Parameters:
 import numpy as np
 from filtering import *
 from plot_figure import *
+import profiling
 
 
 
 # Input data
-data = np.loadtxt("input/synthetic_data.dat")
+with profiling.stage('loadtxt'):
+    data = np.loadtxt("input/synthetic_data.dat")
 
 x = data[:,0]                         # x coordinates (m)
 y = data[:,1]                         # y coordinates (m)
@@ -117,7 +119,7 @@ reg_asa, reg_tdr = asa_tdr(reg_dx_tfa, reg_dy_tfa, reg_dz_tfa)
 '''
 Plot the total-field anomaly, non-regularized and regularized ASA, and non-regularized and regularized TDR - Figure 1
 '''
-plot_figure1(x, y, tfa, asa, reg_asa, tdr, reg_tdr, model)
+plot_figure1(x, y, tfa, asa, reg_asa, tdr, reg_tdr, model, shape)
 
 
 '''